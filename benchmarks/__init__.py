@@ -0,0 +1,23 @@
+# Benchmarks de la API: generador de datos sinteticos (seed), escenarios repetibles (scenarios)
+# y el runner que escribe los resultados en JSON (run). Uso:
+# $ python -m benchmarks.run --schedules 1000000 --output results.json
+# $ python -m benchmarks.run --skip-seed --compare results.json
+
+import os
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+DEFAULT_DATABASE = 'sqlite:////tmp/reserva_benchmark.db'
+
+def bootstrap(database=None):
+    #configura el entorno antes de importar main: sin admin y con la BD de benchmark
+    os.environ['DB_CONNECTION_STRING'] = database or os.environ.get('BENCHMARK_DB_CONNECTION_STRING', DEFAULT_DATABASE)
+    os.environ.setdefault('ENABLE_ADMIN', 'false')
+    os.environ.setdefault('CREATE_DATABASE_ON_START', 'true')
+    os.environ.setdefault('SLOW_REQUEST_MS', '1000000')
+    #sin cache de respuestas: los listados miden el handler (Mix.getAllSerialized) y no un acierto de cache
+    os.environ.setdefault('RESPONSE_CACHE_SIZE', '0')
+    if SRC not in sys.path:
+        sys.path.insert(0, SRC)
+    from main import app
+    return app
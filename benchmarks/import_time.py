@@ -0,0 +1,45 @@
+# Mide el arranque en frio de un worker (import de main + create_app) con distintas combinaciones
+# de componentes opcionales. Cada muestra es un proceso nuevo, como un respawn de gunicorn.
+# $ DB_CONNECTION_STRING=... python benchmarks/import_time.py --runs 10
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from statistics import median
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+VARIANTS = {
+    'full': {'ENABLE_ADMIN': 'true', 'CREATE_DATABASE_ON_START': 'true'},
+    'no_db_check': {'ENABLE_ADMIN': 'true', 'CREATE_DATABASE_ON_START': 'false'},
+    'api_only': {'ENABLE_ADMIN': 'false', 'CREATE_DATABASE_ON_START': 'false'}
+}
+
+def timeImport(variables):
+    env = dict(os.environ, **variables)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import main'], cwd=SRC, env=env, check=True)
+    return time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of the app per startup variant")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--variant', action='append', choices=sorted(VARIANTS))
+    args = parser.parse_args(argv)
+    report = {}
+    for name in args.variant or sorted(VARIANTS):
+        samples = list(map(lambda x: timeImport(VARIANTS[name]), range(args.runs)))
+        report[name] = {
+            'runs': args.runs,
+            'median_ms': round(median(samples) * 1000, 1),
+            'min_ms': round(min(samples) * 1000, 1),
+            'max_ms': round(max(samples) * 1000, 1)
+        }
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# Compara peticiones/segundo y latencias (p50/p99) entre modos de servidor, p.ej.:
+# $ pipenv run start & pipenv run start-asgi
+# $ python benchmarks/load_test.py --target wsgi=http://localhost:3000 --target asgi=http://localhost:3001 \
+#       --path "/schedules/2020-10-07 10:00:00" --path /spaces --concurrency 32 --requests 2000
+
+import sys
+import json
+import time
+import argparse
+from urllib.parse import quote
+from urllib.request import urlopen
+from urllib.error import URLError
+from concurrent.futures import ThreadPoolExecutor
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def timedGet(url, timeout):
+    start = time.perf_counter()
+    try:
+        with urlopen(url, timeout=timeout) as response:
+            response.read()
+            ok = 200 <= response.status < 400
+    except (URLError, OSError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+def runTarget(base_url, paths, concurrency, requests, timeout):
+    urls = list(map(lambda i: base_url.rstrip('/') + quote(paths[i % len(paths)]), range(requests)))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda x: timedGet(x, timeout), urls))
+    elapsed = time.perf_counter() - start
+    latencies = list(map(lambda x: x[0], filter(lambda x: x[1], results)))
+    return {
+        "url": base_url,
+        "requests": requests,
+        "errors": len(results) - len(latencies),
+        "concurrency": concurrency,
+        "requests_per_second": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the API in one or more serving modes")
+    parser.add_argument('--target', action='append', required=True, help="name=base_url, repeatable")
+    parser.add_argument('--path', action='append', help="path to request, repeatable (default /spaces)")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args(argv)
+    paths = args.path or ['/spaces']
+    report = {}
+    for target in args.target:
+        name, base_url = target.split('=', 1)
+        runTarget(base_url, paths, args.concurrency, args.warmup, args.timeout)
+        report[name] = runTarget(base_url, paths, args.concurrency, args.requests, args.timeout)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main()
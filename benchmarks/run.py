@@ -0,0 +1,118 @@
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime
+from statistics import mean
+from benchmarks import bootstrap
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def gitRevision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def runScenario(context, scenario, iterations, warmup, statements):
+    for iteration in range(warmup):
+        scenario(context, iteration).get_data()
+    timings = []
+    counts = []
+    statuses = {}
+    for iteration in range(warmup, warmup + iterations):
+        statements[0] = 0
+        started = time.perf_counter()
+        response = scenario(context, iteration)
+        response.get_data()
+        timings.append((time.perf_counter() - started) * 1000)
+        counts.append(statements[0])
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+    return {
+        'iterations': iterations,
+        'statuses': statuses,
+        'mean_ms': round(mean(timings), 3),
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'max_ms': round(max(timings), 3),
+        'sql_statements': max(counts)
+    }
+
+def compare(results, baseline, threshold):
+    #ratio de p50 actual / referencia; > threshold se marca como regresion
+    comparison = {}
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        ratio = current['p50_ms'] / previous['p50_ms'] if previous['p50_ms'] else None
+        comparison[name] = {
+            'baseline_revision': baseline.get('revision'),
+            'p50_ratio': round(ratio, 3) if ratio else None,
+            'sql_statements_delta': current['sql_statements'] - previous['sql_statements'],
+            'regression': bool(ratio and ratio > threshold)
+        }
+    return comparison
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a benchmark database and run the reservation workload")
+    parser.add_argument('--database', help="SQLAlchemy URL (default BENCHMARK_DB_CONNECTION_STRING or a SQLite file)")
+    parser.add_argument('--enterprises', type=int, default=2000)
+    parser.add_argument('--spaces', type=int, default=200)
+    parser.add_argument('--schedules', type=int, default=100000)
+    parser.add_argument('--skip-seed', action='store_true', help="reuse the data of a previous run")
+    parser.add_argument('--base-date', help="YYYY-MM-DD the seeded bookings end on (default today)")
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--scenario', action='append', help="run only these scenarios, repeatable")
+    parser.add_argument('--output', help="write the JSON results to this file instead of stdout")
+    parser.add_argument('--compare', help="previous JSON results to compare against")
+    parser.add_argument('--threshold', type=float, default=1.2)
+    args = parser.parse_args(argv)
+
+    app = bootstrap(args.database)
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from models import db
+    from benchmarks import scenarios
+    from benchmarks.seed import seedDatabase
+
+    base_date = datetime.strptime(args.base_date, '%Y-%m-%d') if args.base_date else datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    volumes = {'enterprises': args.enterprises, 'spaces': args.spaces, 'schedules': args.schedules}
+    with app.app_context():
+        if not args.skip_seed:
+            started = time.perf_counter()
+            volumes = dict(seedDatabase(args.enterprises, spaces=args.spaces, schedules=args.schedules, base_date=base_date),
+                seed_seconds=round(time.perf_counter() - started, 1))
+        dialect = db.engine.dialect.name
+
+    statements = [0]
+    def count_statement(*args):
+        statements[0] += 1
+    event.listen(Engine, 'before_cursor_execute', count_statement)
+
+    context = scenarios.Context(app, volumes, base_date)
+    selected = args.scenario or list(scenarios.HTTP_SCENARIOS) + list(scenarios.REPORT_SCENARIOS)
+    results = {'revision': gitRevision(), 'timestamp': datetime.utcnow().isoformat(), 'dialect': dialect,
+        'volumes': volumes, 'scenarios': {}, 'reports': {}}
+    for name in selected:
+        if name in scenarios.HTTP_SCENARIOS:
+            results['scenarios'][name] = runScenario(context, scenarios.HTTP_SCENARIOS[name], args.iterations, args.warmup, statements)
+        elif name in scenarios.REPORT_SCENARIOS:
+            results['reports'][name] = scenarios.REPORT_SCENARIOS[name](context)
+    if args.compare:
+        with open(args.compare) as baseline:
+            results['comparison'] = compare(results, json.load(baseline), args.threshold)
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    json.dump(results, output, indent=2)
+    output.write('\n')
+    if args.output:
+        output.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+import random
+import tracemalloc
+import time
+from datetime import timedelta
+from date_convert import ConvertDate
+from benchmarks.seed import PASSWORD
+
+#cada escenario recibe el contexto y la iteracion, y devuelve la respuesta (o None si no es HTTP)
+class Context():
+    def __init__(self, app, volumes, base_date, seed=7):
+        from flask_jwt_extended import create_access_token
+        self.app = app
+        self.client = app.test_client()
+        self.volumes = volumes
+        self.base_date = base_date
+        self.random = random.Random(seed)
+        self.booking_weeks = 60 + random.SystemRandom().randint(0, 2000) #semanas libres aunque se repita con --skip-seed
+        with app.app_context():
+            self.tokens = dict(map(lambda x: (x, create_access_token(identity=x)), range(1, min(volumes['enterprises'], 50) + 1)))
+
+    def enterpriseId(self):
+        return self.random.randint(1, len(self.tokens))
+
+    def headers(self, enterprise_id):
+        return {'Authorization': 'Bearer ' + self.tokens[enterprise_id]}
+
+    def pastDate(self, max_days=90):
+        return self.base_date - timedelta(days=self.random.randint(0, max_days), hours=-self.random.randint(8, 19))
+
+def login(context, iteration):
+    enterprise_id = context.enterpriseId()
+    return context.client.post('/login', json={'email': 'enterprise%d@benchmark.local' % enterprise_id, 'password': PASSWORD})
+
+def weekCalendar(context, iteration):
+    return context.client.get('/schedules/' + ConvertDate.dateToString(context.pastDate()))
+
+def monthlySchedules(context, iteration):
+    enterprise_id = context.enterpriseId()
+    return context.client.get('/schedules_by_month_and_year/' + ConvertDate.dateToString(context.pastDate(365)), headers=context.headers(enterprise_id))
+
+def bulkBooking(context, iteration):
+    #una semana laboral de 8 horas en un espacio; cada iteracion usa una semana futura distinta
+    spaces = context.volumes['spaces']
+    monday = context.base_date + timedelta(days=7 * (context.booking_weeks + iteration // spaces) - context.base_date.weekday())
+    space_id = 1 + iteration % spaces
+    enterprise_id = context.enterpriseId()
+    body = []
+    for day in range(5):
+        for hour in range(9, 17):
+            body.append({'date': ConvertDate.dateToString(monday + timedelta(days=day, hours=hour)),
+                'space_id': space_id, 'enterprise_id': enterprise_id})
+    return context.client.post('/schedules', json=body)
+
+def listEnterprises(context, iteration):
+    return context.client.get('/enterprises?limit=100&fields=name,email,current_hours', headers=context.headers(1))
+
+def listBrands(context, iteration):
+    return context.client.get('/brands?limit=500')
+
+def listSpaces(context, iteration):
+    return context.client.get('/spaces?fields=name,description,spacetype_id,equipments')
+
+def listSpacetypes(context, iteration):
+    return context.client.get('/spacetypes?fields=description')
+
+def listEquipments(context, iteration):
+    return context.client.get('/equipments')
+
+def availability(context, iteration):
+    start = context.pastDate(30).date()
+    return context.client.get('/availability?start=%s&end=%s&from_hour=8&to_hour=20' % (start.isoformat(), (start + timedelta(days=6)).isoformat()))
+
+def utilizationReport(context, iteration):
+    return context.client.get('/reports/spaces?end=' + context.base_date.date().isoformat(), headers=context.headers(1))
+
+HTTP_SCENARIOS = {
+    'login': login,
+    'week_calendar': weekCalendar,
+    'monthly_schedules': monthlySchedules,
+    'bulk_booking': bulkBooking,
+    'list_enterprises': listEnterprises,
+    'list_brands': listBrands,
+    'list_spaces': listSpaces,
+    'list_spacetypes': listSpacetypes,
+    'list_equipments': listEquipments,
+    'availability': availability,
+    'utilization_report': utilizationReport
+}
+
+def explain(query):
+    from models import db
+    statement = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    return {'statement': statement, 'plan': list(map(lambda x: ' '.join(map(str, x)), db.session.execute(prefix + statement)))}
+
+def monthQueryPlan(context):
+    #plan de la consulta mensual: el predicado antiguo con extract() frente al rango semiabierto
+    #sobre ix_schedule_enterprise_id_date, para ver que solo el segundo usa el indice por fecha
+    from sqlalchemy import func
+    from models import db, Schedule
+    start, end = ConvertDate.monthRange(context.base_date)
+    with context.app.app_context():
+        query = db.session.query(Schedule.id).filter(Schedule.enterprise_id == 1)
+        return {
+            'extract': explain(query.filter(func.extract('month', Schedule.date) == start.month, func.extract('year', Schedule.date) == start.year)),
+            'range': explain(query.filter(Schedule.date >= start, Schedule.date < end))
+        }
+
+def projectionVersusOrm(context):
+    #memoria pico y tiempo de serializar una ventana de calendario por proyeccion frente a objetos ORM
+    from models import Schedule
+    today = context.base_date - timedelta(days=7)
+    start = today - timedelta(days=today.weekday()) - timedelta(days=8)
+    end = start + timedelta(days=22)
+    paths = {
+        'projection': lambda: Schedule.getProjectedSerialized(start < Schedule.date, Schedule.date < end),
+        'orm': lambda: list(map(lambda x: x.serialize(), Schedule.eagerQuery().filter(start < Schedule.date, Schedule.date < end)))
+    }
+    report = {}
+    for name, path in paths.items():
+        with context.app.app_context():
+            tracemalloc.start()
+            started = time.perf_counter()
+            rows = len(path())
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        report[name] = {'rows': rows, 'ms': round(elapsed * 1000, 2), 'peak_kib': round(peak / 1024, 1)}
+    return report
+
+def loginThroughput(context, costs=(1000, 50000, 150000, 300000), logins=40, concurrency=8):
+    #logins por segundo con distintos costes de KDF, con peticiones concurrentes contra el pool acotado
+    from concurrent.futures import ThreadPoolExecutor
+    from models import db, Enterprise
+    import passwords
+    emails = list(map(lambda x: 'enterprise%d@benchmark.local' % x, range(1, min(context.volumes['enterprises'], logins) + 1)))
+    report = {'hash_threads': passwords.HASH_THREADS, 'concurrency': concurrency}
+    original = passwords.HASH_ITERATIONS
+    with context.app.app_context():
+        stored_passwords = db.session.query(Enterprise.email, Enterprise.password).filter(Enterprise.email.in_(emails)).all()
+    def attempt(email):
+        with context.app.app_context():
+            return Enterprise.get_enterprise_with_login_credentials(email, PASSWORD) is not None
+    try:
+        for cost in costs:
+            passwords.HASH_ITERATIONS = cost
+            with context.app.app_context():
+                stored = passwords.hashPassword(PASSWORD)
+                db.session.query(Enterprise).filter(Enterprise.email.in_(emails)).update({'password': stored}, synchronize_session=False)
+                db.session.commit()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                accepted = sum(pool.map(attempt, emails))
+            elapsed = time.perf_counter() - started
+            report[str(cost)] = {'logins': len(emails), 'accepted': accepted, 'ms': round(elapsed * 1000, 2),
+                'per_second': round(len(emails) / elapsed, 1)}
+    finally:
+        passwords.HASH_ITERATIONS = original
+        #los escenarios siguientes deben ver los hashes del seed, no los del ultimo coste probado
+        with context.app.app_context():
+            for email, password in stored_passwords:
+                db.session.query(Enterprise).filter_by(email=email).update({'password': password}, synchronize_session=False)
+            db.session.commit()
+    return report
+
+REPORT_SCENARIOS = {
+    'month_query_plan': monthQueryPlan,
+    'projection_vs_orm': projectionVersusOrm,
+    'login_throughput': loginThroughput
+}
@@ -0,0 +1,69 @@
+import random
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+CHUNK_SIZE = 300
+BUSINESS_HOURS = range(8, 20)
+PASSWORD = 'benchmark'
+
+def insertChunks(connection, table, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        connection.execute(table.insert().values(rows[start:start + CHUNK_SIZE]))
+
+def seedDatabase(enterprises=2000, spacetypes=8, spaces=200, schedules=100000, occupancy_rate=0.4, base_date=None, seed=42):
+    #volumen realista: reservas en horario laboral de dias laborables, hacia atras desde base_date
+    from models import db, Enterprise, Brand, Spacetype, Space, Equipment, Schedule, Occupancy, Utilization
+    randomizer = random.Random(seed)
+    base_date = base_date or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    db.drop_all()
+    db.create_all()
+    connection = db.session.connection()
+    #un solo hash compartido: hashear cada empresa con el coste real haria el seed eterno
+    from passwords import hashPassword
+    password = hashPassword(PASSWORD)
+
+    insertChunks(connection, Enterprise.__table__, list(map(lambda x: {
+        'id': x, 'name': 'Enterprise %d' % x, 'last_name': 'Benchmark', 'email': 'enterprise%d@benchmark.local' % x,
+        'password': password, 'cif': 'B%08d' % x, 'phone': '6%08d' % x,
+        'tot_hours': 10 ** 6, 'current_hours': 10 ** 6, 'is_active': x % 20 != 0, 'is_admin': x == 1
+    }, range(1, enterprises + 1))))
+    brands = []
+    for enterprise_id in range(1, enterprises + 1):
+        for brand in range(randomizer.randint(1, 3)):
+            brands.append({'name': 'Brand %d.%d' % (enterprise_id, brand), 'description': 'Synthetic brand',
+                'logo': 'https://example.com/logo.png', 'is_active': True, 'enterprise_id': enterprise_id})
+    insertChunks(connection, Brand.__table__, brands)
+    insertChunks(connection, Spacetype.__table__, list(map(lambda x: {'id': x, 'description': 'Space type %d' % x}, range(1, spacetypes + 1))))
+    insertChunks(connection, Space.__table__, list(map(lambda x: {'id': x, 'name': 'Space %d' % x, 'description': 'Synthetic space',
+        'spacetype_id': randomizer.randint(1, spacetypes)}, range(1, spaces + 1))))
+    insertChunks(connection, Equipment.__table__, list(map(lambda x: {'quantity': randomizer.randint(1, 10), 'name': 'Equipment %d' % x,
+        'description': 'Synthetic equipment', 'space_id': 1 + x % spaces}, range(spaces * 2))))
+
+    #dia a dia: las reservas y sus agregados se insertan por lotes sin materializar el volumen entero
+    pending = OrderedDict([(Schedule.__table__, []), (Occupancy.__table__, []), (Utilization.__table__, [])])
+    total = 0
+    day = base_date
+    while total < schedules:
+        slots = []
+        if day.weekday() < 5:
+            for space_id in range(1, spaces + 1):
+                for hour in BUSINESS_HOURS:
+                    if randomizer.random() < occupancy_rate and total + len(slots) < schedules:
+                        slots.append({'date': day.replace(hour=hour), 'space_id': space_id,
+                            'enterprise_id': randomizer.randint(1, enterprises)})
+        total += len(slots)
+        pending[Schedule.__table__] += slots
+        pending[Occupancy.__table__] += map(lambda x: {'space_id': x[0][0], 'day': x[0][1], 'hours': x[1]},
+            Occupancy.masksBySpaceAndDay(slots).items())
+        pending[Utilization.__table__] += map(lambda x: {'space_id': x[0][0], 'enterprise_id': x[0][1], 'day': x[0][2], 'hours': x[1]},
+            Utilization.hoursByKey(slots).items())
+        for table, rows in pending.items():
+            if len(rows) >= CHUNK_SIZE:
+                insertChunks(connection, table, rows)
+                del rows[:]
+        day -= timedelta(days=1)
+    for table, rows in pending.items():
+        insertChunks(connection, table, rows)
+    db.session.commit()
+    return {'enterprises': enterprises, 'spacetypes': spacetypes, 'spaces': spaces, 'schedules': total,
+        'brands': len(brands), 'first_day': day.date().isoformat(), 'base_date': base_date.date().isoformat()}
@@ -0,0 +1,27 @@
+"""widen enterprise password for salted hashes
+
+Revision ID: c41d7e9a3b25
+Revises: b7a93e0f12c6
+Create Date: 2026-10-18 15:26:41.318027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7e9a3b25'
+down_revision = 'b7a93e0f12c6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # las contrasenas en claro se rehashean en el siguiente login correcto
+    with op.batch_alter_table('enterprise') as batch_op:
+        batch_op.alter_column('password', existing_type=sa.String(length=80), type_=sa.String(length=255), existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('enterprise') as batch_op:
+        batch_op.alter_column('password', existing_type=sa.String(length=255), type_=sa.String(length=80), existing_nullable=False)
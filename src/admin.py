@@ -1,22 +1,111 @@
 import os
-from flask_admin import Admin, BaseView, expose
-from models import db, Enterprise, Schedule, Space, Equipment, Spacetype, Brand
+import time
+import threading
+from collections import OrderedDict
+from flask_admin import Admin, AdminIndexView, expose
+from models import db, Enterprise, Schedule, Space, Equipment, Spacetype, Brand, Occupancy
+from date_convert import ConvertDate
 from flask_admin.contrib.sqla import ModelView
+from sqlalchemy import func
+from sqlalchemy.orm import Query, contains_eager
 
-class MyView(BaseView):
+DASHBOARD_TTL = int(os.environ.get('ADMIN_DASHBOARD_TTL', 60))
+
+dashboards = {}
+dashboard_lock = threading.Lock()
+
+def buildDashboard(now):
+    #solo hoy y esta semana, agregados en SQL: no crece con el historico
+    day_start, day_end = ConvertDate.dayRange(now)
+    week_start, week_end = ConvertDate.weekRange(now)
+    booked = Occupancy.getBookedHours(day_start.date())
+    spaces = Schedule.bookingsPerSpace(week_start, week_end)
+    for space in spaces:
+        space['booked_hours_today'] = booked.get(space['id'], 0)
+    return {
+        'schedule': sorted(Schedule.getProjectedSerialized(Schedule.date >= day_start, Schedule.date < day_end), key=lambda x: x['date']),
+        'spaces': spaces,
+        'enterprises': Schedule.hoursPerEnterprise(week_start, week_end),
+        'occupancy': {'booked_hours': sum(booked.values()), 'spaces_in_use': len(booked), 'spaces': len(spaces)}
+    }
+
+def getDashboard(now):
+    #cache corta por dia: abrir el panel varias veces no repite las consultas
+    key = now.date()
+    with dashboard_lock:
+        cached = dashboards.get(key)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+    dashboard = buildDashboard(now)
+    with dashboard_lock:
+        dashboards.clear()
+        dashboards[key] = (dashboard, time.time() + DASHBOARD_TTL)
+    return dashboard
+
+class MyView(AdminIndexView):
     @expose('/')
     def index(self):
-        import time
-        current_time = time.strftime("%d/%m/%Y")
-        return self.render('index.html', schedule=list(map(lambda x: x.serialize(), Schedule.query.all())), data = current_time)       
+        now = ConvertDate.fixedTimeZoneCurrentTime()
+        dashboard = getDashboard(now)
+        return self.render('index.html', schedule=dashboard['schedule'], stats=dashboard, data=now.strftime("%d/%m/%Y"))
+
+COUNT_TTL = int(os.environ.get('ADMIN_COUNT_TTL', 60))
+COUNT_CACHE_SIZE = int(os.environ.get('ADMIN_COUNT_CACHE_SIZE', 256))
+
+counts = OrderedDict() #LRU: cada busqueda distinta es una clave nueva
+count_lock = threading.Lock()
+
+class CachedCountQuery(Query):
+    #el COUNT(*) de cada listado se cachea unos segundos por sentencia y parametros (filtros, busqueda)
+    def scalar(self):
+        compiled = self.statement.compile(self.session.get_bind())
+        key = str(compiled) + repr(sorted(compiled.params.items()))
+        now = time.time()
+        with count_lock:
+            cached = counts.get(key)
+            if cached is not None and cached[1] > now:
+                counts.move_to_end(key)
+                return cached[0]
+        count = Query.scalar(self)
+        with count_lock:
+            counts[key] = (count, now + COUNT_TTL)
+            counts.move_to_end(key)
+            while len(counts) > COUNT_CACHE_SIZE:
+                counts.popitem(last=False)
+        return count
+
+def clearCounts():
+    with count_lock:
+        counts.clear()
 
 class MyModelView(ModelView):
     column_display_pk = True
+    #los formularios no cargan todas las reservas como opciones del campo de relacion
+    form_excluded_columns = ('schedules',)
+
+    def get_count_query(self):
+        return CachedCountQuery([func.count('*')], session=self.session()).select_from(self.model)
+
+    def after_model_change(self, form, model, is_created):
+        clearCounts()
+
+    def after_model_delete(self, model):
+        clearCounts()
+
+class MyModelViewSchedules(MyModelView):
+    column_default_sort = ('date', True)
+    form_ajax_refs = {
+        'enterprise': {'fields': ('name', 'email')},
+        'space': {'fields': ('name',)}
+    }
 
 class MyModelViewActive(MyModelView):
     def get_query(self):
         return self.session.query(self.model).filter(self.model.is_active==True)
 
+    def get_count_query(self):
+        return super().get_count_query().filter(self.model.is_active==True)
+
     def delete_model(self, model):
         try:
             self.on_model_delete(model)            
@@ -36,18 +125,28 @@ class MyModelViewNotActive(MyModelView):
     def get_query(self):        
         return self.session.query(self.model).filter(self.model.is_active==False)
 
+    def get_count_query(self):
+        return super().get_count_query().filter(self.model.is_active==False)
+
 class MyModelViewBrands(MyModelView):
+    #la empresa ya viene del join del filtro: se reutiliza en vez de un joinedload aparte
+    column_auto_select_related = False
+
     def get_query(self):
-        return self.session.query(self.model).join(Enterprise).filter(Enterprise.is_active==True)
+        return self.session.query(self.model).join(Enterprise).filter(Enterprise.is_active==True) \
+            .options(contains_eager(self.model.enterprise))
+
+    def get_count_query(self):
+        return super().get_count_query().join(Enterprise).filter(Enterprise.is_active==True)
         
 def setup_admin(app):
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'    
-    admin = Admin(app, name='Admin', template_mode='bootstrap3')
+    admin = Admin(app, name='Admin', template_mode='bootstrap3', index_view=MyView())
 
     admin.add_view(MyModelViewActive(Enterprise, db.session, endpoint='enterprises', menu_icon_type='glyph', menu_icon_value='glyphicon-user'))
     admin.add_view(MyModelViewBrands(Brand, db.session, endpoint='brands', menu_icon_type='glyph', menu_icon_value='glyphicon-briefcase'))
-    admin.add_view(MyModelView(Schedule, db.session, endpoint='schedules', menu_icon_type='glyph', menu_icon_value='glyphicon-list-alt'))
+    admin.add_view(MyModelViewSchedules(Schedule, db.session, endpoint='schedules', menu_icon_type='glyph', menu_icon_value='glyphicon-list-alt'))
     admin.add_view(MyModelView(Equipment, db.session, endpoint='equipments', menu_icon_type='glyph', menu_icon_value='glyphicon-wrench'))
     admin.add_view(MyModelView(Space, db.session, endpoint='spaces'))       
     admin.add_view(MyModelView(Spacetype, db.session, endpoint='spacetypes', ))    
@@ -0,0 +1,9 @@
+# Entrada ASGI para servir la misma app con uvicorn, junto a wsgi.py (gunicorn).
+# Cada peticion corre en un pool de hilos acotado: una consulta lenta ocupa un hilo, no un worker entero.
+# $ uvicorn asgi:application --app-dir ./src --workers 2
+
+import os
+from a2wsgi import WSGIMiddleware
+from main import app
+
+application = WSGIMiddleware(app, workers=int(os.environ.get('ASGI_THREADS', 10)))
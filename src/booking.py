@@ -0,0 +1,70 @@
+from itertools import islice
+from sqlalchemy.exc import IntegrityError
+from models import db, Enterprise, Schedule, Space
+from decorators.retry_on_conflict_decorator import retry_on_conflict
+from exceptions.not_enough_hours_error import NotEnoughHoursError
+from exceptions.duplicate_entity_error import DuplicateEntityError
+from exceptions.unknown_entity_error import UnknownEntityError
+
+CHUNK_SIZE = 500
+
+def chunked(slots, size=CHUNK_SIZE):
+    slots = iter(slots)
+    chunk = list(islice(slots, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(slots, size))
+
+def checkSpaces(space_ids):
+    #un solo IN: un space_id inexistente no debe llegar al INSERT y confundirse con un duplicado
+    existing = set(map(lambda x: x.id, db.session.query(Space.id).filter(Space.id.in_(space_ids))))
+    missing = sorted(set(space_ids) - existing)
+    if missing:
+        raise UnknownEntityError(missing)
+
+def duplicatesOrRaise(error, conflicts):
+    #solo las violaciones de la restriccion unica son duplicados; cualquier otra IntegrityError se propaga
+    if not conflicts:
+        raise error
+    return DuplicateEntityError(conflicts)
+
+@retry_on_conflict()
+def reserveSlots(enterprise_id, slots):
+    checkSpaces(set(map(lambda x: x['space_id'], slots)))
+    conflicts = Schedule.getConflictingSlots(slots)
+    if conflicts:
+        raise DuplicateEntityError(conflicts)
+    #el descuento es un UPDATE condicional: solo bloquea la fila de esta empresa hasta el commit
+    if not Enterprise.debitHours(enterprise_id, len(slots)):
+        raise NotEnoughHoursError()
+    try:
+        Schedule.insertSlots(slots)
+        db.session.commit()
+    except IntegrityError as error:
+        db.session.rollback()
+        raise duplicatesOrRaise(error, Schedule.getConflictingSlots(slots))
+
+@retry_on_conflict()
+def reserveRecurrence(enterprise_id, space_ids, total, expand):
+    #expand() devuelve un generador nuevo cada vez: una pasada para validar y otra para insertar,
+    #siempre por lotes, con un unico descuento de horas entre medias. Los espacios y las horas
+    #se comprueban antes de recorrer la regla: una peticion imposible no lanza ninguna consulta por lote
+    checkSpaces(space_ids)
+    current_hours = db.session.query(Enterprise.current_hours).filter_by(id=enterprise_id).scalar()
+    if current_hours is None or current_hours < total:
+        raise NotEnoughHoursError()
+    conflicts = []
+    for chunk in chunked(expand()):
+        conflicts += Schedule.getConflictingRange(chunk)
+    if conflicts:
+        raise DuplicateEntityError(conflicts)
+    if not Enterprise.debitHours(enterprise_id, total):
+        raise NotEnoughHoursError()
+    try:
+        for chunk in chunked(expand()):
+            Schedule.insertSlots(chunk)
+        db.session.commit()
+    except IntegrityError as error:
+        db.session.rollback()
+        raise duplicatesOrRaise(error, [conflict for chunk in chunked(expand()) for conflict in Schedule.getConflictingRange(chunk)])
+    return total
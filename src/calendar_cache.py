@@ -0,0 +1,106 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
+from models import db, Enterprise, Space
+from response_cache import versions, expiresAt, isFresh
+
+CALENDAR_CACHE_BYTES = int(os.environ.get('CALENDAR_CACHE_BYTES', 64 * 1024 * 1024))
+WINDOW_DAYS = 22
+WINDOW_OFFSET_DAYS = 8
+#version comun a todas las ventanas: los cuerpos incluyen enterprise_name y space_name
+NAMES_KEY = 'calendar-names'
+
+windows = OrderedDict()
+lock = threading.Lock()
+used_bytes = [0]
+
+def windowStart(date):
+    #domingo a medianoche, 8 dias antes del lunes de la semana pedida
+    monday = date.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=date.weekday())
+    return monday - timedelta(days=WINDOW_OFFSET_DAYS)
+
+def windowKey(start):
+    return 'calendar-' + start.strftime('%Y%m%d')
+
+def windowStartsContaining(date):
+    #ventanas (start, start + 22 dias) que contienen date: como mucho 4 domingos
+    first = windowStart(date - timedelta(days=WINDOW_DAYS))
+    starts = []
+    while first <= date:
+        if first < date < first + timedelta(days=WINDOW_DAYS):
+            starts.append(first)
+        first += timedelta(days=7)
+    return starts
+
+def getOrBuild(start, build):
+    key = windowKey(start)
+    version = versions.get((key, NAMES_KEY))
+    with lock:
+        cached = windows.get(key)
+        if cached is not None and isFresh(cached[0], version):
+            windows.move_to_end(key)
+            return cached[1]
+    body = build()
+    store(key, {'versions': version, 'expires': expiresAt()}, body)
+    return body
+
+def store(key, state, body):
+    if len(body) > CALENDAR_CACHE_BYTES:
+        return
+    with lock:
+        previous = windows.pop(key, None)
+        if previous is not None:
+            used_bytes[0] -= len(previous[1])
+        windows[key] = (state, body)
+        used_bytes[0] += len(body)
+        while used_bytes[0] > CALENDAR_CACHE_BYTES:
+            used_bytes[0] -= len(windows.popitem(last=False)[1][1])
+
+def evictDates(dates):
+    keys = set(map(windowKey, [start for date in dates for start in windowStartsContaining(date)]))
+    if not keys:
+        return
+    versions.bump(keys)
+    with lock:
+        for key in keys:
+            evicted = windows.pop(key, None)
+            if evicted is not None:
+                used_bytes[0] -= len(evicted[1])
+
+#models.applySlotChanges anota los huecos tocados (SQL directo y eventos ORM); solo se invalida tras el commit
+@event.listens_for(db.session, 'after_commit')
+def evict_changed_windows(session):
+    slots = session.info.pop('changed_slots', None)
+    if slots:
+        evictDates(set(map(lambda x: x['date'], slots)))
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_changed_windows(session):
+    session.info.pop('changed_slots', None)
+
+#renombrar (o borrar, con sus reservas en cascada) una empresa o un espacio invalida todas las ventanas
+def names_changed(mapper, connection, target):
+    object_session(target).info['changed_names'] = True
+
+def name_updated(mapper, connection, target):
+    if inspect(target).attrs['name'].history.has_changes():
+        names_changed(mapper, connection, target)
+
+for model in (Enterprise, Space):
+    event.listen(model, 'after_update', name_updated)
+    event.listen(model, 'after_delete', names_changed)
+
+@event.listens_for(db.session, 'after_commit')
+def evict_renamed_windows(session):
+    if session.info.pop('changed_names', None):
+        versions.bump((NAMES_KEY,))
+        with lock:
+            windows.clear()
+            used_bytes[0] = 0
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_renamed_windows(session):
+    session.info.pop('changed_names', None)
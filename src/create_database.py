@@ -1,9 +1,11 @@
-import os 
-
-from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy_utils import database_exists, create_database
 
-def init_database():
-    engine = create_engine(os.environ.get('DB_CONNECTION_STRING'))
-    if not database_exists(engine.url):
-        create_database(engine.url)
\ No newline at end of file
+def init_database(engine):
+    #reutiliza el engine de la app: si conecta, la BD existe y la conexion queda en el pool.
+    #mysql-connector levanta ProgrammingError (1049) si la BD no existe, no OperationalError
+    try:
+        engine.connect().close()
+    except DBAPIError:
+        if not database_exists(engine.url):
+            create_database(engine.url)
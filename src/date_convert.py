@@ -4,7 +4,34 @@ class ConvertDate():
     @staticmethod
     def stringToDate(string):
         return datetime.strptime(string, '%Y-%m-%d %H:%M:%S')
+
+    @staticmethod
+    def stringToDay(string):
+        return datetime.strptime(string, '%Y-%m-%d').date()
+
+    @staticmethod
+    def dateToString(date):
+        return date.strftime('%Y-%m-%d %H:%M:%S')
         
+    @staticmethod
+    def monthRange(date):
+        #intervalo semiabierto [inicio de mes, inicio del mes siguiente) para filtrar por indice
+        start = datetime(date.year, date.month, 1)
+        if date.month == 12:
+            return start, datetime(date.year + 1, 1, 1)
+        return start, datetime(date.year, date.month + 1, 1)
+
+    @staticmethod
+    def dayRange(date):
+        start = datetime(date.year, date.month, date.day)
+        return start, start + timedelta(days=1)
+
+    @staticmethod
+    def weekRange(date):
+        #semana de lunes a lunes
+        start = ConvertDate.dayRange(date)[0] - timedelta(days=date.weekday())
+        return start, start + timedelta(days=7)
+
     @staticmethod
     def fixedTimeZoneCurrentTime():
         return datetime.now().replace(microsecond=0) + timedelta(hours=2)
\ No newline at end of file
@@ -0,0 +1,15 @@
+from functools import wraps
+from flask import request
+import response_cache
+
+
+def cached_response(*models): #modelos cuyo cambio invalida la respuesta cacheada
+    tables = tuple(map(lambda x: x.__tablename__, models))
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET':
+                return f(*args, **kwargs)
+            return response_cache.serve(tables, f, args, kwargs)
+        return decorated_function
+    return decorator
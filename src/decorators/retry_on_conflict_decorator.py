@@ -0,0 +1,38 @@
+import time
+from functools import wraps
+from sqlalchemy.exc import DBAPIError
+from models import db
+
+TRANSIENT_SQLSTATES = ('40001', '40P01') #fallo de serializacion, deadlock (postgres)
+TRANSIENT_ERRNOS = (1213, 1205) #deadlock, lock wait timeout (mysql)
+
+def isTransient(error):
+    #mysql-connector levanta 1213 como InternalError y 1205 como DatabaseError: se mira el codigo, no la clase
+    if error.connection_invalidated:
+        return True
+    orig = error.orig
+    sqlstate = getattr(orig, 'sqlstate', None) or getattr(orig, 'pgcode', None)
+    errno = getattr(orig, 'errno', None)
+    if errno is None and orig is not None and orig.args and isinstance(orig.args[0], int):
+        errno = orig.args[0] #mysqlclient/pymysql: (errno, mensaje)
+    if sqlstate in TRANSIENT_SQLSTATES or errno in TRANSIENT_ERRNOS:
+        return True
+    return 'database is locked' in str(orig) #sqlite sin codigo: otra conexion tiene el bloqueo de escritura
+
+def retry_on_conflict(retries=3, backoff=0.05): #reintenta la transaccion completa si la BD la aborta (deadlock, serializacion, lock)
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            for attempt in range(retries):
+                try:
+                    return f(*args, **kwargs)
+                except DBAPIError as error:
+                    db.session.rollback()
+                    if attempt == retries - 1 or not isTransient(error):
+                        raise
+                    time.sleep(backoff * (2 ** attempt))
+                except Exception:
+                    db.session.rollback() #cualquier otro error deja la sesion limpia antes de propagarse
+                    raise
+        return decorated_function
+    return decorator
@@ -0,0 +1,108 @@
+import os
+import time
+import threading
+from sqlalchemy import event, exc
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+#valores por entorno (FLASK_ENV); cada uno se puede sobreescribir con su variable DB_*
+ENVIRONMENTS = {
+    'development': {'pool_size': 2, 'max_overflow': 3, 'pool_timeout': 10, 'pool_recycle': 1800, 'statement_timeout': 30000},
+    'production': {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 30, 'pool_recycle': 280, 'statement_timeout': 15000}
+}
+
+OVERRIDES = {
+    'pool_size': 'DB_POOL_SIZE',
+    'max_overflow': 'DB_MAX_OVERFLOW',
+    'pool_timeout': 'DB_POOL_TIMEOUT',
+    'pool_recycle': 'DB_POOL_RECYCLE',
+    'statement_timeout': 'DB_STATEMENT_TIMEOUT_MS'
+}
+
+class TimedQueuePool(QueuePool):
+    #QueuePool que mide cuanto espera cada checkout por una conexion libre
+    def __init__(self, *args, **kwargs):
+        QueuePool.__init__(self, *args, **kwargs)
+        self.metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return QueuePool._do_get(self)
+        except exc.TimeoutError:
+            with self.metrics_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            with self.metrics_lock:
+                self.checkouts += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+def poolSettings(environment=None):
+    environment = environment or os.environ.get('FLASK_ENV', 'production')
+    settings = dict(ENVIRONMENTS.get(environment, ENVIRONMENTS['production']))
+    for setting, variable in OVERRIDES.items():
+        if os.environ.get(variable):
+            settings[setting] = int(os.environ[variable])
+    return settings
+
+def engineOptions(uri, environment=None):
+    if not uri or make_url(uri).get_backend_name() == 'sqlite':
+        return {}
+    settings = poolSettings(environment)
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': settings['pool_size'],
+        'max_overflow': settings['max_overflow'],
+        'pool_timeout': settings['pool_timeout'],
+        'pool_recycle': settings['pool_recycle'],
+        'pool_pre_ping': True
+    }
+
+def setupEngine(engine, environment=None):
+    timeout = poolSettings(environment)['statement_timeout']
+    backend = engine.url.get_backend_name()
+    if backend == 'postgresql':
+        statement = 'SET statement_timeout = %d' % timeout
+    elif backend == 'mysql':
+        statement = 'SET SESSION max_execution_time = %d' % timeout
+    else:
+        return
+    @event.listens_for(engine, 'connect')
+    def set_statement_timeout(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(statement)
+        cursor.close()
+
+def poolHealth(engine):
+    #sin consultas: un pool saturado se informa pero no tumba el health check, las peticiones esperan su turno
+    pool = engine.pool
+    health = {'pool': pool.__class__.__name__, 'healthy': True, 'saturated': False}
+    if isinstance(pool, QueuePool):
+        max_overflow = poolSettings()['max_overflow']
+        health.update({'checked_out': pool.checkedout(), 'overflow': pool.overflow(),
+            'capacity': pool.size() + max_overflow if max_overflow >= 0 else None})
+        health['saturated'] = max_overflow >= 0 and pool.checkedin() == 0 and pool.overflow() >= max_overflow
+    return health
+
+def poolMetrics(engine):
+    pool = engine.pool
+    metrics = {'pool': pool.__class__.__name__, 'status': pool.status()}
+    if isinstance(pool, QueuePool):
+        metrics.update({'size': pool.size(), 'checked_out': pool.checkedout(), 'overflow': pool.overflow()})
+    if isinstance(pool, TimedQueuePool):
+        with pool.metrics_lock:
+            metrics.update({
+                'checkouts': pool.checkouts,
+                'timeouts': pool.timeouts,
+                'wait_total_ms': round(pool.total_wait * 1000, 3),
+                'wait_avg_ms': round(pool.total_wait * 1000 / pool.checkouts, 3) if pool.checkouts else 0,
+                'wait_max_ms': round(pool.max_wait * 1000, 3)
+            })
+    return metrics
@@ -0,0 +1,12 @@
+from utils import APIException
+
+class DuplicateEntityError(APIException):
+
+    def __init__(self, conflicts, message="Duplicate entity", status_code=409, payload=None):
+        APIException.__init__(self,message, status_code, payload)
+        self.conflicts = conflicts
+
+    def to_dict(self):
+        rv = APIException.to_dict(self)
+        rv['conflicts'] = self.conflicts
+        return rv
@@ -0,0 +1,6 @@
+from utils import APIException
+
+class LoginBusyError(APIException):
+
+    def __init__(self, message="Too many logins in progress, try again later", status_code=503, payload=None):
+        APIException.__init__(self,message, status_code, payload)
@@ -0,0 +1,6 @@
+from utils import APIException
+
+class NotEnoughHoursError(APIException):
+
+    def __init__(self, message="Enterprise has not enough hours", status_code=424, payload=None):
+        APIException.__init__(self,message, status_code, payload)
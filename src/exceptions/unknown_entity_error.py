@@ -0,0 +1,12 @@
+from utils import APIException
+
+class UnknownEntityError(APIException):
+
+    def __init__(self, ids, message="Unknown space", status_code=422, payload=None):
+        APIException.__init__(self,message, status_code, payload)
+        self.ids = ids
+
+    def to_dict(self):
+        rv = APIException.to_dict(self)
+        rv['space_ids'] = self.ids
+        return rv
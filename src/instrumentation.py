@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import logging
+import threading
+from flask import g, request, jsonify, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+MAX_STATEMENTS_LOGGED = 20
+
+logger = logging.getLogger('reserva.slow_requests')
+
+endpoints = {}
+lock = threading.Lock()
+
+#los listeners solo anotan en g si la peticion esta siendo medida: fuera de una peticion no hacen nada
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'request_started' in g:
+        context.instrumentation_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'instrumentation_started', None)
+    if started is None or not has_request_context():
+        return
+    elapsed = (time.perf_counter() - started) * 1000
+    g.sql_count += 1
+    g.sql_ms += elapsed
+    if len(g.sql_statements) < MAX_STATEMENTS_LOGGED:
+        g.sql_statements.append({'ms': round(elapsed, 3), 'statement': statement})
+
+def start_request():
+    g.request_started = time.perf_counter()
+    g.sql_count = 0
+    g.sql_ms = 0.0
+    g.sql_statements = []
+
+def remember_status(response):
+    g.response_status = response.status_code
+    return response
+
+def finish_request(error=None):
+    #teardown: tambien cubre las respuestas en streaming, que consultan la BD despues de after_request
+    if 'request_started' not in g:
+        return
+    elapsed = (time.perf_counter() - g.request_started) * 1000
+    endpoint = request.endpoint or 'unmatched'
+    status = 500 if error is not None else g.get('response_status', 200)
+    with lock:
+        stats = endpoints.setdefault(endpoint, {'requests': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'sql_count': 0, 'sql_ms': 0.0})
+        stats['requests'] += 1
+        stats['errors'] += 1 if status >= 500 else 0
+        stats['total_ms'] += elapsed
+        stats['max_ms'] = max(stats['max_ms'], elapsed)
+        stats['sql_count'] += g.sql_count
+        stats['sql_ms'] += g.sql_ms
+    if elapsed >= SLOW_REQUEST_MS:
+        logger.warning(json.dumps({
+            'event': 'slow_request',
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'ms': round(elapsed, 3),
+            'sql_count': g.sql_count,
+            'sql_ms': round(g.sql_ms, 3),
+            'statements': g.sql_statements
+        }))
+
+def endpointMetrics():
+    with lock:
+        return dict(map(lambda x: (x[0], dict(x[1],
+            avg_ms=round(x[1]['total_ms'] / x[1]['requests'], 3),
+            avg_sql_count=round(x[1]['sql_count'] / x[1]['requests'], 2),
+            total_ms=round(x[1]['total_ms'], 3),
+            max_ms=round(x[1]['max_ms'], 3),
+            sql_ms=round(x[1]['sql_ms'], 3))), endpoints.items()))
+
+def init_instrumentation(app, extra_metrics=None, protect=None):
+    #protect: decorador de la vista /metrics (p. ej. solo administradores); puede inyectar argumentos
+    app.before_request(start_request)
+    app.after_request(remember_status)
+    app.teardown_request(finish_request)
+
+    def metrics(**kwargs):
+        report = {'endpoints': endpointMetrics()}
+        if extra_metrics:
+            report.update(extra_metrics())
+        return jsonify(report), 200
+    app.add_url_rule('/metrics', 'metrics', protect(metrics) if protect else metrics)
@@ -1,62 +1,82 @@
+import io
 import os
 import json
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_migrate import Migrate
-from flask_swagger import swagger
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
-from models import db, Enterprise, Schedule, Space, Equipment, Spacetype, Brand
+from utils import APIException, generate_sitemap, stream_json_array, json_body
+from models import db, Enterprise, Schedule, Space, Equipment, Spacetype, Brand, Occupancy, Utilization
 from create_database import init_database
+from engine_config import engineOptions, setupEngine, poolMetrics, poolHealth
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from instrumentation import init_instrumentation
 from datetime import datetime, timedelta, date
 from date_convert import ConvertDate
 from flask_jwt_extended import (
     JWTManager, jwt_required, create_access_token, create_refresh_token, jwt_refresh_token_required, get_jwt_identity,get_raw_jwt
 )
-from sqlalchemy import extract
 from decorators.admin_required_decorator import admin_required
-
-app = Flask(__name__)
-app.url_map.strict_slashes = False
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DB_CONNECTION_STRING')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-init_database()
-MIGRATE = Migrate(app, db)
-db.init_app(app)
-CORS(app)
-setup_admin(app)
-
-app.config['JWT_SECRET_KEY'] = 'super-secret'
-app.config['JWT_BLACKLIST_'] = True
-app.config['JWT_BLACKLIST_TOKEN_CHECKS'] = ['access', 'refresh']
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = 999999
-
-jwt = JWTManager(app)
-
-blacklist=set()
+from decorators.cached_response_decorator import cached_response
+from booking import reserveSlots, reserveRecurrence
+from exceptions.not_enough_hours_error import NotEnoughHoursError
+from exceptions.duplicate_entity_error import DuplicateEntityError
+from revocation_store import createRevocationStore
+from principal_cache import getCurrentPrincipal
+import calendar_cache
+from schedule_transfer import FORMATS, readRows, importSchedules, dateCriteria, exportSchedules, schedules_cli
+from exceptions.not_allowed_error import NotAllowedError
+
+api = Blueprint('api', __name__)
+migrate = Migrate()
+jwt = JWTManager()
+
+revocation_store = createRevocationStore()
 
 # login_manager= LoginManager()
 # login_manager.init_app(app)
 # login_manager.login_view='login'
 
+MAX_PAGE_SIZE = 1000
+MAX_TOKEN_LIFETIME = 30 * 24 * 3600
+MAX_AVAILABILITY_DAYS = 93
+MAX_RECURRENCE_DAYS = 366
+MAX_RECURRENCE_SLOTS = 5000
+MAX_REPORT_DAYS = 731
+
 def toJson(model):
     return jsonify(model.serialize())
 
-def addCommitArray(arrayToSave):
-    db.session.bulk_save_objects(arrayToSave)
-    db.session.commit()
+def expandArgs():
+    expand = request.args.get('expand')
+    return expand.split(',') if expand else []
+
+def listJson(model, stream=False):
+    limit = request.args.get('limit', type=int)
+    after = request.args.get('after', type=int)
+    fields = request.args.get('fields')
+    if fields:
+        fields = fields.split(',')
+    if stream and limit is None:
+        return stream_json_array(model.iterSerialized(after, fields))
+    if limit is not None:
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    models = model.getAllSerialized(limit, after, fields)
+    response = jsonify(models)
+    if limit is not None and len(models) == limit:
+        response.headers['X-Next-After'] = models[-1]['id']
+    return response
 
 @jwt.token_in_blacklist_loader
 def check_if_token_in_blacklist(decrypted_token):
-    jti = decrypted_token['jti']
-    return jti in blacklist
+    return revocation_store.isRevoked(decrypted_token['jti'])
 
 # @login_manager.user_loader
 # def load_user(user_id):
 #     return Enterprise.query.filter_by(id=user_id).one()
 
-@app.route('/login', methods=['POST'])
+@api.route('/login', methods=['POST'])
 def login():
     if not request.is_json:
         return jsonify({"msg": "Missing JSON in request"}), 400
@@ -80,14 +100,14 @@ def login():
         'access_token': access_token,
         'refresh_token': create_refresh_token(identity=enterprise.id),
         'is_admin': enterprise.verify_admin(),
-        'user': enterprise.serialize()
+        'user': enterprise.serializeSummary(expandArgs())
         
     }
     return jsonify(ret), 200
 
     # Identity can be any data that is json serializable
     
-@app.route('/refresh', methods=['POST'])
+@api.route('/refresh', methods=['POST'])
 @jwt_refresh_token_required
 def refresh():
     user_id = get_jwt_identity()
@@ -96,41 +116,64 @@ def refresh():
     }
     return jsonify(ret), 200
     
-@app.route('/protected', methods=['GET'])
+@api.route('/protected', methods=['GET'])
 @jwt_required
 def protected():
     # Access the identity of the current user with get_jwt_identity
-    current_user = get_jwt_identity()
-    return Enterprise.getById(current_user).serialize(), 200
+    current_user = getCurrentPrincipal()
+    if not current_user:
+        raise NotAllowedError()
+    expand = expandArgs()
+    return Enterprise.eagerQuery(expand).get(current_user.id).serializeSummary(expand), 200
 
-@app.errorhandler(APIException)
+@api.app_errorhandler(APIException)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
-@app.route('/')
+@api.route('/')
 def sitemap():
-    return generate_sitemap(app)
+    return current_app.extensions['sitemap']
+
+@api.route('/health', methods=['GET'])
+def health():
+    status = poolHealth(db.engine)
+    if request.args.get('deep'):
+        try:
+            with db.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+            status['database'] = 'ok'
+        except SQLAlchemyError:
+            status['database'] = 'unreachable'
+            status['healthy'] = False
+    #solo una BD inalcanzable (?deep=1) saca la instancia del balanceador; la saturacion va en el cuerpo
+    return jsonify(status), 200 if status['healthy'] else 503
 
     
-@app.route('/logout', methods=['DELETE'])
+@api.route('/metrics/pool', methods=['GET'])
+@jwt_required
+@admin_required
+def pool_metrics(user):
+    return jsonify(poolMetrics(db.engine)), 200
+
+@api.route('/logout', methods=['DELETE'])
 @jwt_required
 def logout():
-    jti = get_raw_jwt()['jti']
-    blacklist.add(jti)
+    raw_jwt = get_raw_jwt()
+    revocation_store.revoke(raw_jwt['jti'], raw_jwt.get('exp', time.time() + MAX_TOKEN_LIFETIME))
     return jsonify({"msg": "Successfully logged out"}), 200
 
-@app.route('/enterprises', methods=['GET', 'POST'])
+@api.route('/enterprises', methods=['GET', 'POST'])
 @jwt_required
 def handle_enterprises():
     if request.method == 'GET':
-        return jsonify(Enterprise.getAllSerialized()), 200 
+        return listJson(Enterprise, stream=True), 200
     if request.method == 'POST':
         body = request.get_json()       
         newEnterprise = Enterprise.newInstance(body)       
         newEnterprise.addCommit()
         return toJson(newEnterprise), 201
 
-@app.route('/enterprises/<int:id>', methods=['GET', 'PUT'])
+@api.route('/enterprises/<int:id>', methods=['GET', 'PUT'])
 def handle_enterprise(id):
     enterprise = Enterprise.getById(id)
     if request.method == 'GET':
@@ -141,17 +184,18 @@ def handle_enterprise(id):
         enterprise.store()
         return json.dumps({"Message" : "Correctly scheduled"}), 200
 
-@app.route('/brands', methods=['GET', 'POST'])
+@api.route('/brands', methods=['GET', 'POST'])
+@cached_response(Brand)
 def handle_brands():
     if request.method == 'GET':
-        return jsonify(Brand.getAllSerialized()), 200 
+        return listJson(Brand), 200
     if request.method == 'POST':
         body = request.get_json()
         newBrand = Brand.newInstance(body)        
         newBrand.addCommit()
         return toJson(newBrand), 201
 
-@app.route('/brands/<int:id>', methods=['GET', 'PUT'])
+@api.route('/brands/<int:id>', methods=['GET', 'PUT'])
 def handle_brand(id):
     brand = Brand.query.get(id)
     if request.method == 'GET':        
@@ -162,49 +206,103 @@ def handle_brand(id):
         brand.store()
         return json.dumps({"Message" : "Correctly scheduled"}), 200
 
-@app.route('/schedules/<date>', methods=['GET'])
+@api.route('/schedules/<date>', methods=['GET'])
 def handle_schedule_before_after(date): 
-    today = ConvertDate.stringToDate(date)
-    start = today - timedelta(days=today.weekday()) - timedelta(days=8)
-    end = start + timedelta(days=22)
-    schedules = db.session.query(Schedule).filter(start < Schedule.date).filter(Schedule.date < end )
-    return jsonify(list(map(lambda y: y.serialize(), schedules))), 200
+    start = calendar_cache.windowStart(ConvertDate.stringToDate(date))
+    end = start + timedelta(days=calendar_cache.WINDOW_DAYS)
+    body = calendar_cache.getOrBuild(start, lambda: json_body(Schedule.getProjectedSerialized(start < Schedule.date, Schedule.date < end)))
+    return Response(body, mimetype='application/json'), 200
 
-@app.route('/schedules/<id>', methods=['DELETE'])
+@api.route('/schedules/<id>', methods=['DELETE'])
 @jwt_required
 def delete_schedule(id):
     schedule = Schedule.query.get(id) 
     schedule.delete()
     return jsonify({"msg": "Successfully deleted"}), 200
 
-@app.route('/schedules_by_month_and_year/<date>', methods=['GET'])
+@api.route('/schedules_by_month_and_year/<date>', methods=['GET'])
 @jwt_required
 def handle_schedule_by_month(date): 
-    month_and_year_date = ConvertDate.stringToDate(date)
+    start, end = ConvertDate.monthRange(ConvertDate.stringToDate(date))
     current_user = get_jwt_identity()
-    schedules = db.session.query(Schedule).filter(current_user==Schedule.enterprise_id).filter(extract('month', Schedule.date) == month_and_year_date.month,extract('year', Schedule.date) == month_and_year_date.year).all()
-    return jsonify(list(map(lambda y: y.serialize(), schedules))), 200
+    return jsonify(Schedule.getProjectedSerialized(current_user==Schedule.enterprise_id, Schedule.date >= start, Schedule.date < end)), 200
 
-@app.route('/schedules', methods=['POST'])
+@api.route('/schedules', methods=['POST'])
 def handle_schedules():
     body = request.get_json()
-    schedulesToAdd = []
-    enterprise = Enterprise.query.get(body[0]['enterprise_id'])        
-    if enterprise.userHasNotEnoughHours(len(body)): 
+    schedulesToAdd = Schedule.slotsFromBody(body)
+    now = ConvertDate.fixedTimeZoneCurrentTime()
+    if any(map(lambda x: x['date'] <= now, schedulesToAdd)):
+        return json.dumps({"Message" : "Past dates are not selectable"}), 422
+    try:
+        reserveSlots(body[0]['enterprise_id'], schedulesToAdd)
+    except NotEnoughHoursError:
         return json.dumps({"Message" : "Enterprise has not enough hours"}), 424
-    for schedule in body:
-        newSchedule = Schedule.newInstance(schedule)
-        if newSchedule.isSpaceReservedThisHour(newSchedule.date, newSchedule.space_id):
-            return json.dumps({"Message" : "Duplicate entity"}), 409        
-        if ConvertDate.stringToDate(newSchedule.date) > ConvertDate.fixedTimeZoneCurrentTime():
-            schedulesToAdd.append(newSchedule)
-    if len(schedulesToAdd) == len(body):
-        enterprise.subtractHours(len(schedulesToAdd))
-        addCommitArray(schedulesToAdd)
-        return json.dumps({"Message" : "Correctly scheduled"}), 201
-    return json.dumps({"Message" : "Past dates are not selectable"}), 422         
-
-@app.route('/schedules/<int:id>', methods=['GET', 'PUT'])
+    except DuplicateEntityError as error:
+        return json.dumps({"Message" : "Duplicate entity", "conflicts": error.conflicts}), 409
+    return json.dumps({"Message" : "Correctly scheduled"}), 201
+
+@api.route('/schedules/recurring', methods=['POST'])
+def handle_recurring_schedules():
+    #regla: {"enterprise_id", "space_ids", "weekdays" (0 = lunes), "start", "end", "from_hour", "to_hour"}
+    body = request.get_json()
+    try:
+        enterprise_id = int(body['enterprise_id'])
+        space_ids = sorted(set(map(int, body['space_ids'])))
+        weekdays = set(map(int, body['weekdays']))
+        start = ConvertDate.stringToDay(body['start'])
+        end = ConvertDate.stringToDay(body['end'])
+        from_hour = int(body['from_hour'])
+        to_hour = int(body['to_hour'])
+    except (KeyError, TypeError, ValueError):
+        raise APIException("start/end must be YYYY-MM-DD, space_ids and weekdays lists of integers and enterprise_id, from_hour and to_hour integers")
+    if not 0 <= from_hour < to_hour <= 24 or not weekdays <= set(range(7)):
+        raise APIException("from_hour and to_hour must satisfy 0 <= from_hour < to_hour <= 24 and weekdays go from 0 (Monday) to 6")
+    if not 0 <= (end - start).days < MAX_RECURRENCE_DAYS:
+        raise APIException("end must be on or after start and at most %d days later" % (MAX_RECURRENCE_DAYS - 1))
+    total = Schedule.countRecurrence(space_ids, weekdays, start, end, from_hour, to_hour)
+    if total == 0:
+        return json.dumps({"Message" : "The recurrence has no slots"}), 422
+    if total > MAX_RECURRENCE_SLOTS:
+        raise APIException("The recurrence has %d slots, at most %d are allowed" % (total, MAX_RECURRENCE_SLOTS))
+    expand = lambda: Schedule.expandRecurrence(enterprise_id, space_ids, weekdays, start, end, from_hour, to_hour)
+    if next(expand())['date'] <= ConvertDate.fixedTimeZoneCurrentTime():
+        return json.dumps({"Message" : "Past dates are not selectable"}), 422
+    try:
+        total = reserveRecurrence(enterprise_id, space_ids, total, expand)
+    except NotEnoughHoursError:
+        return json.dumps({"Message" : "Enterprise has not enough hours"}), 424
+    except DuplicateEntityError as error:
+        return json.dumps({"Message" : "Duplicate entity", "conflicts": error.conflicts}), 409
+    return json.dumps({"Message" : "Correctly scheduled", "slots": total}), 201
+
+def transferFormat(default):
+    format = request.args.get('format', default)
+    if format not in FORMATS:
+        raise APIException("format must be one of: %s" % ', '.join(FORMATS))
+    return format
+
+@api.route('/schedules/import', methods=['POST'])
+@jwt_required
+@admin_required
+def handle_schedule_import(user):
+    #el cuerpo se lee en streaming; el formato sale de ?format= o del Content-Type
+    format = transferFormat('ndjson' if request.mimetype == FORMATS['ndjson'] else 'csv')
+    rows = readRows(io.TextIOWrapper(request.stream, encoding='utf-8'), format)
+    return jsonify(importSchedules(rows)), 200
+
+@api.route('/schedules/export', methods=['GET'])
+@jwt_required
+@admin_required
+def handle_schedule_export(user):
+    format = transferFormat('csv')
+    try:
+        criterion = dateCriteria(request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        raise APIException("start and end must be YYYY-MM-DD")
+    return Response(stream_with_context(exportSchedules(format, *criterion)), mimetype=FORMATS[format])
+
+@api.route('/schedules/<int:id>', methods=['GET', 'PUT'])
 def handle_schedule(id):
     schedule = Schedule.query.get(id)
     if request.method == 'GET':
@@ -221,17 +319,62 @@ def handle_schedule(id):
         schedule.store()        
         return json.dumps({"Message" : "Correctly scheduled"}), 200
 
-@app.route('/spaces', methods=['GET', 'POST'])
+@api.route('/availability', methods=['GET'])
+def handle_availability():
+    try:
+        start = ConvertDate.stringToDay(request.args['start'])
+        end = ConvertDate.stringToDay(request.args.get('end', request.args['start']))
+        from_hour = request.args.get('from_hour', 0, type=int)
+        to_hour = request.args.get('to_hour', 24, type=int)
+        space_ids = request.args.get('space_ids')
+        space_ids = list(map(int, space_ids.split(','))) if space_ids else None
+    except (KeyError, ValueError):
+        raise APIException("start/end must be YYYY-MM-DD and space_ids a comma separated list of ids")
+    if not 0 <= from_hour < to_hour <= 24:
+        raise APIException("from_hour and to_hour must satisfy 0 <= from_hour < to_hour <= 24")
+    if not 0 <= (end - start).days < MAX_AVAILABILITY_DAYS:
+        raise APIException("end must be on or after start and at most %d days later" % (MAX_AVAILABILITY_DAYS - 1))
+    if space_ids is None:
+        space_ids = list(map(lambda x: x.id, db.session.query(Space.id).order_by(Space.id)))
+    return jsonify(Occupancy.getAvailability(space_ids, start, end, from_hour, to_hour)), 200
+
+def reportArgs():
+    #start/end en YYYY-MM-DD (por defecto el ultimo anyo) e ids opcionales separados por comas
+    try:
+        end = ConvertDate.stringToDay(request.args['end']) if 'end' in request.args else date.today()
+        start = ConvertDate.stringToDay(request.args['start']) if 'start' in request.args else end - timedelta(days=365)
+        ids = request.args.get('ids')
+        ids = list(map(int, ids.split(','))) if ids else None
+    except ValueError:
+        raise APIException("start/end must be YYYY-MM-DD and ids a comma separated list of ids")
+    if not 0 <= (end - start).days < MAX_REPORT_DAYS:
+        raise APIException("end must be on or after start and at most %d days later" % (MAX_REPORT_DAYS - 1))
+    return start, end, ids
+
+@api.route('/reports/spaces', methods=['GET'])
+@jwt_required
+@admin_required
+def handle_space_report(user):
+    return jsonify(Utilization.getMonthlyHours(Utilization.space_id, *reportArgs())), 200
+
+@api.route('/reports/enterprises', methods=['GET'])
+@jwt_required
+@admin_required
+def handle_enterprise_report(user):
+    return jsonify(Utilization.getMonthlyHours(Utilization.enterprise_id, *reportArgs())), 200
+
+@api.route('/spaces', methods=['GET', 'POST'])
+@cached_response(Space, Equipment, Schedule, Enterprise)
 def handle_spaces():
     if request.method == 'GET':
-        return jsonify(Space.getAllSerialized()), 200
+        return listJson(Space), 200
     if request.method == 'POST':
         body = request.get_json()
         newSpace = Space.newInstance(body)
         newSpace.addCommit()
         return toJson(newSpace), 201
 
-@app.route('/spaces/<int:id>', methods=['GET', 'PUT'])
+@api.route('/spaces/<int:id>', methods=['GET', 'PUT'])
 def handle_space(id):
     space = Space.query.get(id)
     if request.method == 'GET':        
@@ -242,17 +385,18 @@ def handle_space(id):
         space.store()
         return json.dumps({"Message" : "Correctly scheduled"}), 200
 
-@app.route('/spacetypes', methods=['GET', 'POST'])
+@api.route('/spacetypes', methods=['GET', 'POST'])
+@cached_response(Spacetype, Space, Equipment, Schedule, Enterprise)
 def handle_spacetypes():
     if request.method == 'GET':
-        return jsonify(Spacetype.getAllSerialized()), 200
+        return listJson(Spacetype), 200
     if request.method == 'POST':
         body = request.get_json()
         newSpacetype = Spacetype.newInstance(body)
         newSpacetype.addCommit()
         return toJson(newSpacetype), 201
 
-@app.route('/spacetypes/<int:id>', methods=['GET', 'PUT'])
+@api.route('/spacetypes/<int:id>', methods=['GET', 'PUT'])
 def handle_spacetype(id):
     spacetype = Spacetype.query.get(id)
     if request.method == 'GET':
@@ -264,17 +408,18 @@ def handle_spacetype(id):
         return json.dumps({"Message" : "Correctly scheduled"}), 200
 
 
-@app.route('/equipments', methods=['GET', 'POST'])
+@api.route('/equipments', methods=['GET', 'POST'])
+@cached_response(Equipment)
 def handle_equipments():
     if request.method == 'GET':
-        return jsonify(Equipment.getAllSerialized()), 200
+        return listJson(Equipment), 200
     if request.method == 'POST':
         body = request.get_json()
         newEquipment = Equipment.newInstance(body)
         newEquipment.addCommit()
         return toJson(newEquipment), 201
 
-@app.route('/equipments/<int:id>', methods=['GET', 'PUT'])
+@api.route('/equipments/<int:id>', methods=['GET', 'PUT'])
 def handle_equipment(id):
     equipment = Equipment.query.get(id)
     if request.method == 'GET':        
@@ -285,6 +430,47 @@ def handle_equipment(id):
         equipment.store()
         return json.dumps({"Message" : "Correctly scheduled"}), 200
 
+def isEnabled(variable, default):
+    return os.environ.get(variable, str(default)).lower() in ('1', 'true', 'yes')
+
+def create_app():
+    #los componentes opcionales (admin, creacion de BD) solo se importan/ejecutan si estan activados
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DB_CONNECTION_STRING')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engineOptions(app.config['SQLALCHEMY_DATABASE_URI'])
+
+    migrate.init_app(app, db)
+    db.init_app(app)
+    with app.app_context():
+        setupEngine(db.engine)
+        if isEnabled('CREATE_DATABASE_ON_START', app.config['ENV'] == 'development'):
+            init_database(db.engine)
+    CORS(app, expose_headers=['X-Next-After'])
+    if isEnabled('ENABLE_ADMIN', True):
+        from admin import setup_admin
+        setup_admin(app)
+
+    app.config['JWT_SECRET_KEY'] = 'super-secret'
+    app.config['JWT_BLACKLIST_ENABLED'] = True
+    app.config['JWT_BLACKLIST_TOKEN_CHECKS'] = ['access', 'refresh']
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = 999999
+    jwt.init_app(app)
+
+    app.register_blueprint(api)
+    app.cli.add_command(schedules_cli)
+    if isEnabled('ENABLE_INSTRUMENTATION', True):
+        #las metricas exponen rutas, tiempos y el estado del pool: solo para administradores
+        init_instrumentation(app, lambda: {'pool': poolMetrics(db.engine)}, lambda view: jwt_required(admin_required(view)))
+
+    #el sitemap solo depende de las rutas registradas: se genera una vez al arrancar
+    with app.test_request_context():
+        app.extensions['sitemap'] = generate_sitemap(app)
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
     app.run(host='0.0.0.0', port=PORT, debug=False)
@@ -1,16 +1,83 @@
 from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, event, func, inspect
+from sqlalchemy.dialects import mysql, postgresql
+from sqlalchemy.orm import joinedload, selectinload, validates
 from sqlalchemy_utils import force_instant_defaults
+from date_convert import ConvertDate
+from passwords import hashPassword, isHashed, needsRehash, verifyPassword
 
 db = SQLAlchemy()
 force_instant_defaults()
 
+FULL_DAY = (1 << 24) - 1
+
+def markChanged(*models):
+    #las sentencias SQL directas no pasan por el flush: se anotan a mano para invalidar caches al hacer commit
+    db.session.info.setdefault('changed_tables', set()).update(map(lambda x: x.__tablename__, models))
+
 class Mix():
     @classmethod
-    def getAllSerialized(cls):
-        models = cls.query.all()
-        models = list(map(lambda x: x.serialize(), models))
+    def loaderPlan(cls):
+        #relaciones que serialize() recorre -> opciones de carga para traerlas en pocas consultas
+        return {}
+
+    @classmethod
+    def loadOptions(cls, fields=None):
+        plan = cls.loaderPlan()
+        return [option for field in plan if fields is None or field in fields for option in plan[field]]
+
+    @classmethod
+    def eagerQuery(cls, fields=None):
+        return cls.query.options(*cls.loadOptions(fields))
+
+    @classmethod
+    def serializableFields(cls):
+        return list(map(lambda x: x.name, cls.__table__.columns)) + list(cls.loaderPlan())
+
+    @classmethod
+    def getAllSerialized(cls, limit=None, after=None, fields=None):
+        #paginacion por keyset sobre id (limit/after) y seleccion de campos (fields)
+        if fields is not None:
+            fields = ['id'] + list(filter(lambda x: x != 'id' and x in cls.serializableFields(), fields))
+        query = cls.eagerQuery(fields)
+        if after is not None:
+            query = query.filter(cls.id > after)
+        if limit is not None or after is not None:
+            query = query.order_by(cls.id)
+        if limit is not None:
+            query = query.limit(limit)
+        models = list(map(lambda x: x.serializeFields(fields), query.all()))
         return models
 
+    @classmethod
+    def iterSerialized(cls, after=None, fields=None, batch_size=500):
+        #lotes por keyset: memoria constante y compatible con los selectinload del loaderPlan
+        while True:
+            models = cls.getAllSerialized(batch_size, after, fields)
+            for model in models:
+                yield model
+            if len(models) < batch_size:
+                return
+            after = models[-1]['id']
+
+    @classmethod
+    def projectionQuery(cls):
+        #solo columnas: filas planas sin objetos ORM ni identity map
+        return db.session.query(*cls.__table__.columns)
+
+    @classmethod
+    def getProjectedSerialized(cls, *criterion):
+        rows = cls.projectionQuery().filter(*criterion)
+        return list(map(lambda x: x._asdict(), rows))
+
+    @classmethod
+    def iterProjected(cls, *criterion, batch_size=1000):
+        #yield_per activa stream_results: cursor del lado del servidor donde el driver lo soporta
+        rows = cls.projectionQuery().filter(*criterion).yield_per(batch_size)
+        for row in rows:
+            yield row._asdict()
+
     @classmethod
     def getById(cls, id):
         model = cls.query.get(id)
@@ -28,9 +95,16 @@ class Mix():
         sched = cls.query.filter_by(date=date, space_id=space_id)
         return db.session.query(sched.exists()).scalar() 
 
-    @classmethod
-    def get_enterprise_with_login_credentials(cls,email,password):
-        return db.session.query(cls).filter(Enterprise.email==email).filter(Enterprise.password==password).one_or_none()
+    def serializeFields(self, fields=None):
+        if fields is None:
+            return self.serialize()
+        serialized = {}
+        for field in fields:
+            value = getattr(self, field)
+            if isinstance(value, list):
+                value = list(map(lambda x: x.serialize(), value))
+            serialized[field] = value
+        return serialized
 
     def updateModel(self, body):           
         for attribute in body:
@@ -54,15 +128,22 @@ class Enterprise(db.Model, Mix):
     name = db.Column(db.String(80), nullable=False)
     last_name = db.Column(db.String(80), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(80), nullable=False)
+    password = db.Column(db.String(255), nullable=False)
     cif = db.Column(db.String(20), nullable=False)
     phone = db.Column(db.String(20), unique=True, nullable=False)
     tot_hours = db.Column(db.Integer, default=0, nullable=False)
     current_hours = db.Column(db.Integer, nullable=False)
-    is_active = db.Column(db.Boolean, default=True)
+    is_active = db.Column(db.Boolean, default=True, index=True)
     is_admin = db.Column(db.Boolean, default=False)
     brands = db.relationship('Brand', cascade="all,delete", backref='enterprise', lazy=True)
     schedules = db.relationship("Schedule", back_populates="enterprise")
+
+    @classmethod
+    def loaderPlan(cls):
+        return {
+            "brands": [selectinload(cls.brands)],
+            "schedules": [selectinload(cls.schedules).joinedload(Schedule.space)]
+        }
     
     def serialize(self):
         return {
@@ -70,7 +151,6 @@ class Enterprise(db.Model, Mix):
             "name": self.name,
             "last_name": self.last_name,
             "email": self.email,
-            "password": self.password,
             "cif": self.cif,
             "phone": self.phone,
             "tot_hours": self.tot_hours, 
@@ -81,6 +161,35 @@ class Enterprise(db.Model, Mix):
             "schedules": list(map(lambda x: x.serialize(), self.schedules)) 
         }
 
+    @validates('password')
+    def validate_password(self, key, password):
+        #nunca se guarda en claro: formularios del admin, POST/PUT y seeds pasan por aqui
+        return password if isHashed(password) else hashPassword(password)
+
+    @classmethod
+    def serializableFields(cls):
+        return list(filter(lambda x: x != 'password', super().serializableFields()))
+
+    @classmethod
+    def get_enterprise_with_login_credentials(cls,email,password):
+        #busqueda solo por email (indice unico); el hash se verifica fuera de SQL
+        enterprise = cls.query.filter(cls.email == email).one_or_none()
+        if enterprise is None or not verifyPassword(enterprise.password, password):
+            return None
+        if needsRehash(enterprise.password):
+            enterprise.password = hashPassword(password)
+            db.session.commit()
+        return enterprise
+
+    @classmethod
+    def summaryFields(cls):
+        return list(filter(lambda x: x != 'password', map(lambda x: x.name, cls.__table__.columns)))
+
+    def serializeSummary(self, expand=None):
+        #perfil resumido: solo columnas; las relaciones se piden explicitamente con expand
+        expand = list(filter(lambda x: x in self.loaderPlan(), expand or []))
+        return self.serializeFields(self.summaryFields() + expand)
+
     def verify_admin(self):  
         print()   #esta funcion retorna una respuesta de true o false, indicando si es administrador o no. 
         return self.is_admin                               
@@ -92,16 +201,28 @@ class Enterprise(db.Model, Mix):
         else: False
 
     def subtractHours(self, length):
-        self.current_hours = self.current_hours - length
+        subtracted = Enterprise.debitHours(self.id, length)
+        db.session.expire(self, ['current_hours'])
+        return subtracted
+
+    @classmethod
+    def debitHours(cls, id, length):
+        #decremento atomico en la BD: falla si otra reserva ya consumio las horas
+        table = cls.__table__
+        result = db.session.execute(table.update()
+            .where(and_(table.c.id == id, table.c.current_hours >= length))
+            .values(current_hours=table.c.current_hours - length))
+        markChanged(cls)
+        return result.rowcount == 1
 
 class Brand(db.Model, Mix):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(250), nullable=False)
     description = db.Column(db.String(250), nullable=False)
     logo = db.Column(db.String(250), nullable=False)
-    is_active = db.Column(db.Boolean, default=True)
+    is_active = db.Column(db.Boolean, default=True, index=True)
     enterprise_id = db.Column(db.Integer, db.ForeignKey('enterprise.id', ondelete='CASCADE', onupdate='CASCADE'),
-        nullable=False)
+        nullable=False, index=True)
     
     def serialize(self):
         return {
@@ -117,6 +238,15 @@ class Spacetype(db.Model, Mix):
     id = db.Column(db.Integer, primary_key=True)  
     description = db.Column(db.String(250), nullable=False)
     spaces = db.relationship('Space', cascade="all,delete", backref='spacetype', lazy=True)
+
+    @classmethod
+    def loaderPlan(cls):
+        return {
+            "spaces": [
+                selectinload(cls.spaces).selectinload(Space.equipments),
+                selectinload(cls.spaces).selectinload(Space.schedules).joinedload(Schedule.enterprise)
+            ]
+        }
     
     def serialize(self):
         return {
@@ -134,6 +264,14 @@ class Space(db.Model, Mix):
     spacetype_id = db.Column(db.Integer, db.ForeignKey('spacetype.id', ondelete='CASCADE', onupdate='CASCADE'),
         nullable=False)
     schedules = db.relationship("Schedule", back_populates="space")
+
+    @classmethod
+    def loaderPlan(cls):
+        return {
+            "equipments": [selectinload(cls.equipments)],
+            "schedules": [selectinload(cls.schedules).joinedload(Schedule.enterprise)]
+        }
+
     def serialize(self):
         return {
             "id": self.id,
@@ -151,16 +289,125 @@ class Schedule(db.Model, Mix):
     enterprise_id = db.Column(db.Integer, db.ForeignKey('enterprise.id', ondelete='CASCADE', onupdate='CASCADE'), nullable=False)
     enterprise = db.relationship("Enterprise", back_populates="schedules")
     space = db.relationship("Space", back_populates="schedules")
-    __table_args__ = (db.UniqueConstraint('space_id', 'date'),)
+    __table_args__ = (
+        db.UniqueConstraint('space_id', 'date'),
+        db.Index('ix_schedule_enterprise_id_date', 'enterprise_id', 'date'),
+        db.Index('ix_schedule_date', 'date')
+    )
+
+    @classmethod
+    def loaderPlan(cls):
+        return {
+            "enterprise_name": [joinedload(cls.enterprise)],
+            "space_name": [joinedload(cls.space)]
+        }
     
+    @classmethod
+    def projectionQuery(cls):
+        return db.session.query(cls.id, cls.date, cls.space_id, cls.enterprise_id,
+            Enterprise.name.label('enterprise_name'), Space.name.label('space_name')) \
+            .join(Enterprise, cls.enterprise_id == Enterprise.id) \
+            .join(Space, cls.space_id == Space.id)
+
+    @classmethod
+    def bookingsPerSpace(cls, start, end):
+        #agregados en SQL: el coste depende del rango, no del historico de reservas
+        rows = db.session.query(Space.id, Space.name, func.count(cls.id).label('bookings')) \
+            .outerjoin(cls, and_(cls.space_id == Space.id, cls.date >= start, cls.date < end)) \
+            .group_by(Space.id, Space.name).order_by(Space.id)
+        return list(map(lambda x: x._asdict(), rows))
+
+    @classmethod
+    def hoursPerEnterprise(cls, start, end):
+        #cada reserva es una hora
+        hours = func.count(cls.id).label('hours')
+        rows = db.session.query(Enterprise.id, Enterprise.name, hours) \
+            .join(cls, cls.enterprise_id == Enterprise.id) \
+            .filter(cls.date >= start, cls.date < end) \
+            .group_by(Enterprise.id, Enterprise.name).order_by(hours.desc())
+        return list(map(lambda x: x._asdict(), rows))
+
+    @property
+    def enterprise_name(self):
+        return self.enterprise.name
+
+    @property
+    def space_name(self):
+        return self.space.name
+
+    @classmethod
+    def slotsFromBody(cls, body):
+        return list(map(lambda x: {
+            "date": ConvertDate.stringToDate(x['date']),
+            "space_id": int(x['space_id']),
+            "enterprise_id": int(x['enterprise_id'])
+        }, body))
+
+    @classmethod
+    def getConflictingSlots(cls, slots):
+        #una sola consulta para todos los pares (space_id, date) + los repetidos dentro del mismo lote
+        if not slots:
+            return []
+        keys = list(map(lambda x: (x['space_id'], x['date']), slots))
+        conditions = list(map(lambda x: and_(cls.space_id == x[0], cls.date == x[1]), set(keys)))
+        conflicts = set(db.session.query(cls.space_id, cls.date).filter(or_(*conditions)).all())
+        seen = set()
+        for key in keys:
+            if key in seen:
+                conflicts.add(key)
+            seen.add(key)
+        return list(map(lambda x: {"space_id": x[0], "date": ConvertDate.dateToString(x[1])}, sorted(conflicts)))
+
+    @classmethod
+    def getConflictingRange(cls, slots):
+        #lotes ordenados por fecha: un rango sobre el indice (space_id, date) en vez de un OR por hueco
+        keys = set(map(lambda x: (x['space_id'], x['date']), slots))
+        dates = list(map(lambda x: x[1], keys))
+        rows = db.session.query(cls.space_id, cls.date) \
+            .filter(cls.space_id.in_(set(map(lambda x: x[0], keys))), cls.date >= min(dates), cls.date <= max(dates))
+        conflicts = filter(lambda x: (x.space_id, x.date) in keys, rows)
+        return list(map(lambda x: {"space_id": x.space_id, "date": ConvertDate.dateToString(x.date)}, sorted(conflicts)))
+
+    @staticmethod
+    def expandRecurrence(enterprise_id, space_ids, weekdays, start, end, from_hour, to_hour):
+        #generador en orden de fecha: la regla no se materializa entera en memoria
+        day = start
+        while day <= end:
+            if day.weekday() in weekdays:
+                for space_id in space_ids:
+                    for hour in range(from_hour, to_hour):
+                        yield Schedule.slot(datetime(day.year, day.month, day.day, hour), space_id, enterprise_id)
+            day += timedelta(days=1)
+
+    @staticmethod
+    def countRecurrence(space_ids, weekdays, start, end, from_hour, to_hour):
+        #mismo total que expandRecurrence sin recorrer los dias: semanas completas mas el resto
+        weeks, rest = divmod((end - start).days + 1, 7)
+        days = weeks * len(weekdays) + len(set(map(lambda x: (start.weekday() + x) % 7, range(rest))) & weekdays)
+        return days * len(space_ids) * (to_hour - from_hour)
+
+    @classmethod
+    def insertSlots(cls, slots):
+        #un unico INSERT multi-fila; la UniqueConstraint('space_id', 'date') rechaza reservas simultaneas
+        if slots:
+            db.session.execute(cls.__table__.insert().values(slots))
+            applySlotChanges(db.session.connection(), added=slots)
+            markChanged(cls, Occupancy, Utilization)
+
+    @staticmethod
+    def slot(date, space_id, enterprise_id):
+        if isinstance(date, str):
+            date = ConvertDate.stringToDate(date)
+        return {"date": date, "space_id": int(space_id), "enterprise_id": int(enterprise_id)}
+
     def serialize(self):
         return {
             "id": self.id,
             "date": self.date,
             "space_id": self.space_id,
             "enterprise_id": self.enterprise_id,
-            "enterprise_name": self.enterprise.name,
-            "space_name": self.space.name
+            "enterprise_name": self.enterprise_name,
+            "space_name": self.space_name
         }
 
 class Equipment(db.Model, Mix):
@@ -169,7 +416,7 @@ class Equipment(db.Model, Mix):
     name = db.Column(db.String(250), nullable=False)    
     description = db.Column(db.String(250), nullable=False)
     space_id = db.Column(db.Integer, db.ForeignKey('space.id', ondelete='CASCADE', onupdate='CASCADE'),
-        nullable=False)
+        nullable=False, index=True)
     
     def serialize(self):
         return {
@@ -179,3 +426,155 @@ class Equipment(db.Model, Mix):
             "description": self.description,
             "space_id": self.space_id
         }
+
+class RevokedToken(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class Occupancy(db.Model):
+    #bitmap de horas ocupadas por (espacio, dia): bit h a 1 = hora h reservada
+    space_id = db.Column(db.Integer, db.ForeignKey('space.id', ondelete='CASCADE', onupdate='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    hours = db.Column(db.Integer, default=0, nullable=False)
+
+    @staticmethod
+    def masksBySpaceAndDay(slots):
+        masks = {}
+        for slot in slots:
+            key = (slot['space_id'], slot['date'].date())
+            masks[key] = masks.get(key, 0) | (1 << slot['date'].hour)
+        return masks
+
+    @classmethod
+    def markSlots(cls, connection, slots):
+        table = cls.__table__
+        rows = list(map(lambda x: {"space_id": x[0][0], "day": x[0][1], "hours": x[1]}, cls.masksBySpaceAndDay(slots).items()))
+        upsertHours(connection, table, rows, lambda current, new: current.op('|')(new))
+
+    @classmethod
+    def clearSlots(cls, connection, slots):
+        table = cls.__table__
+        for (space_id, day), mask in cls.masksBySpaceAndDay(slots).items():
+            connection.execute(table.update()
+                .where(and_(table.c.space_id == space_id, table.c.day == day))
+                .values(hours=table.c.hours.op('&')(FULL_DAY ^ mask)))
+
+    @classmethod
+    def getBookedHours(cls, day):
+        rows = db.session.query(cls.space_id, cls.hours).filter(cls.day == day, cls.hours != 0)
+        return dict(map(lambda x: (x.space_id, bin(x.hours).count('1')), rows))
+
+    @classmethod
+    def getAvailability(cls, space_ids, start, end, from_hour=0, to_hour=24):
+        #horas libres = ventana AND NOT ocupadas, sin tocar la tabla schedule
+        window = ((1 << to_hour) - 1) ^ ((1 << from_hour) - 1)
+        rows = db.session.query(cls.space_id, cls.day, cls.hours) \
+            .filter(cls.space_id.in_(space_ids), cls.day >= start, cls.day <= end)
+        occupied = dict(map(lambda x: ((x.space_id, x.day), x.hours), rows))
+        availability = []
+        for space_id in space_ids:
+            day = start
+            while day <= end:
+                free = window & ~occupied.get((space_id, day), 0)
+                availability.append({
+                    "space_id": space_id,
+                    "day": day.isoformat(),
+                    "free_hours": list(filter(lambda x: free >> x & 1, range(from_hour, to_hour))),
+                    "available": free == window
+                })
+                day += timedelta(days=1)
+        return availability
+
+class Utilization(db.Model):
+    #horas reservadas por (espacio, empresa, dia): los informes agregan aqui sin recorrer schedule
+    space_id = db.Column(db.Integer, db.ForeignKey('space.id', ondelete='CASCADE', onupdate='CASCADE'), primary_key=True)
+    enterprise_id = db.Column(db.Integer, db.ForeignKey('enterprise.id', ondelete='CASCADE', onupdate='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    hours = db.Column(db.Integer, default=0, nullable=False)
+    __table_args__ = (
+        db.Index('ix_utilization_day', 'day'),
+        db.Index('ix_utilization_enterprise_id_day', 'enterprise_id', 'day')
+    )
+
+    @staticmethod
+    def hoursByKey(slots):
+        hours = {}
+        for slot in slots:
+            key = (slot['space_id'], slot['enterprise_id'], slot['date'].date())
+            hours[key] = hours.get(key, 0) + 1
+        return hours
+
+    @classmethod
+    def addSlots(cls, connection, slots):
+        rows = list(map(lambda x: {"space_id": x[0][0], "enterprise_id": x[0][1], "day": x[0][2], "hours": x[1]},
+            cls.hoursByKey(slots).items()))
+        upsertHours(connection, cls.__table__, rows, lambda current, new: current + new)
+
+    @classmethod
+    def removeSlots(cls, connection, slots):
+        table = cls.__table__
+        for (space_id, enterprise_id, day), hours in cls.hoursByKey(slots).items():
+            connection.execute(table.update()
+                .where(and_(table.c.space_id == space_id, table.c.enterprise_id == enterprise_id, table.c.day == day))
+                .values(hours=table.c.hours - hours))
+
+    @classmethod
+    def getMonthlyHours(cls, column, start, end, ids=None):
+        #horas por (column, anyo, mes) en [start, end]
+        year = func.extract('year', cls.day).label('year')
+        month = func.extract('month', cls.day).label('month')
+        rows = db.session.query(column, year, month, func.sum(cls.hours).label('hours')) \
+            .filter(cls.day >= start, cls.day <= end, cls.hours > 0)
+        if ids is not None:
+            rows = rows.filter(column.in_(ids))
+        rows = rows.group_by(column, year, month).order_by(column, year, month)
+        return list(map(lambda x: {column.key: x[0], "year": int(x.year), "month": int(x.month), "hours": int(x.hours)}, rows))
+
+def upsertHours(connection, table, rows, combine):
+    #INSERT o combinacion con la fila existente (misma clave primaria) en una sentencia donde el dialecto lo permite
+    if not rows:
+        return
+    if connection.dialect.name == 'postgresql':
+        statement = postgresql.insert(table).values(rows)
+        connection.execute(statement.on_conflict_do_update(index_elements=list(table.primary_key.columns),
+            set_={"hours": combine(table.c.hours, statement.excluded.hours)}))
+    elif connection.dialect.name == 'mysql':
+        statement = mysql.insert(table).values(rows)
+        connection.execute(statement.on_duplicate_key_update(hours=combine(table.c.hours, statement.inserted.hours)))
+    else:
+        for row in rows:
+            result = connection.execute(table.update()
+                .where(and_(*map(lambda x: x == row[x.name], table.primary_key.columns)))
+                .values(hours=combine(table.c.hours, row['hours'])))
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(row))
+
+def applySlotChanges(connection, added=(), removed=()):
+    #punto unico para mantener los indices derivados de schedule dentro de la misma transaccion
+    db.session.info.setdefault('changed_slots', []).extend(list(added) + list(removed))
+    if removed:
+        Occupancy.clearSlots(connection, removed)
+        Utilization.removeSlots(connection, removed)
+    if added:
+        Occupancy.markSlots(connection, added)
+        Utilization.addSlots(connection, added)
+
+def previousValue(target, attribute):
+    history = inspect(target).attrs[attribute].history
+    return history.deleted[0] if history.deleted else getattr(target, attribute)
+
+@event.listens_for(Schedule, 'after_insert')
+def schedule_inserted(mapper, connection, target):
+    applySlotChanges(connection, added=[Schedule.slot(target.date, target.space_id, target.enterprise_id)])
+
+@event.listens_for(Schedule, 'after_update')
+def schedule_updated(mapper, connection, target):
+    previous = Schedule.slot(*map(lambda x: previousValue(target, x), ('date', 'space_id', 'enterprise_id')))
+    current = Schedule.slot(target.date, target.space_id, target.enterprise_id)
+    if previous != current:
+        applySlotChanges(connection, added=[current], removed=[previous])
+
+@event.listens_for(Schedule, 'after_delete')
+def schedule_deleted(mapper, connection, target):
+    applySlotChanges(connection, removed=[Schedule.slot(*map(lambda x: previousValue(target, x), ('date', 'space_id', 'enterprise_id')))])
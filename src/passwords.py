@@ -0,0 +1,43 @@
+import os
+import hmac
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+from exceptions.login_busy_error import LoginBusyError
+
+HASH_ALGORITHM = 'sha256'
+HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 150000))
+HASH_THREADS = int(os.environ.get('PASSWORD_HASH_THREADS', 4))
+HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+#pbkdf2 suelta el GIL: el pool limita cuantos calculos caros corren a la vez por worker
+#y el resto de peticiones del worker siguen atendiendose mientras tanto
+executor = ThreadPoolExecutor(max_workers=HASH_THREADS, thread_name_prefix='password-hash')
+
+def runBounded(function, *args):
+    future = executor.submit(function, *args)
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        raise LoginBusyError()
+
+def hashMethod(iterations=None):
+    return 'pbkdf2:%s:%d' % (HASH_ALGORITHM, iterations or HASH_ITERATIONS)
+
+def hashPassword(password, iterations=None):
+    return runBounded(generate_password_hash, password, hashMethod(iterations))
+
+def isHashed(stored):
+    #formato de werkzeug: pbkdf2:<algoritmo>:<iteraciones>$<sal>$<hash>
+    return stored.startswith('pbkdf2:') and stored.count('$') == 2
+
+def needsRehash(stored, iterations=None):
+    if not isHashed(stored):
+        return True
+    return stored.split('$', 1)[0] != hashMethod(iterations)
+
+def verifyPassword(stored, password):
+    if not isHashed(stored):
+        #registros antiguos en texto plano: se comparan en tiempo constante y se rehashean al entrar
+        return hmac.compare_digest(stored.encode('utf-8'), password.encode('utf-8'))
+    return runBounded(check_password_hash, stored, password)
@@ -0,0 +1,64 @@
+import time
+import threading
+from collections import namedtuple, OrderedDict
+from flask import g
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
+from models import db, Enterprise
+
+Principal = namedtuple('Principal', ['id', 'is_admin', 'is_active'])
+
+PRINCIPAL_FIELDS = ('is_admin', 'is_active')
+PRINCIPAL_TTL = 30
+PRINCIPAL_CACHE_SIZE = 10000
+
+principals = OrderedDict()
+lock = threading.Lock()
+
+def getCurrentPrincipal():
+    #cache por peticion (g) delante de la cache entre peticiones
+    if 'principal' not in g:
+        current_user_id = get_jwt_identity()
+        g.principal = getPrincipal(current_user_id) if current_user_id else None
+    return g.principal
+
+def getPrincipal(id):
+    now = time.time()
+    with lock:
+        cached = principals.get(id)
+        if cached is not None and cached[1] > now:
+            principals.move_to_end(id)
+            return cached[0]
+    row = db.session.query(Enterprise.id, Enterprise.is_admin, Enterprise.is_active).filter(Enterprise.id == id).one_or_none()
+    principal = Principal(*row) if row else None
+    with lock:
+        principals[id] = (principal, now + PRINCIPAL_TTL)
+        principals.move_to_end(id)
+        while len(principals) > PRINCIPAL_CACHE_SIZE:
+            principals.popitem(last=False)
+    return principal
+
+def invalidatePrincipal(id):
+    with lock:
+        principals.pop(id, None)
+
+#se invalida tras el commit para no volver a cachear el valor antiguo entre el flush y el commit
+@event.listens_for(Enterprise, 'after_update')
+def enterprise_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(map(lambda x: state.attrs[x].history.has_changes(), PRINCIPAL_FIELDS)):
+        object_session(target).info.setdefault('changed_principals', set()).add(target.id)
+
+@event.listens_for(Enterprise, 'after_delete')
+def enterprise_deleted(mapper, connection, target):
+    object_session(target).info.setdefault('changed_principals', set()).add(target.id)
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_changed_principals(session):
+    for id in session.info.pop('changed_principals', ()):
+        invalidatePrincipal(id)
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_changed_principals(session):
+    session.info.pop('changed_principals', None)
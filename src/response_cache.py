@@ -0,0 +1,126 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from flask import request, make_response
+from sqlalchemy import event
+from models import db
+
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 256))
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 30))
+#cabeceras que se recalculan al servir; el resto (X-Next-After...) se guarda con el cuerpo
+REBUILT_HEADERS = ('content-type', 'content-length', 'etag', 'cache-control', 'set-cookie')
+
+class MemoryVersions():
+    #version por tabla dentro del proceso: otros workers no ven los cambios, por eso las entradas caducan a los ttl segundos
+    def __init__(self, ttl=RESPONSE_CACHE_TTL):
+        self.ttl = ttl
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def get(self, tables):
+        with self.lock:
+            return tuple(map(lambda x: self.versions.get(x, 0), tables))
+
+    def bump(self, tables):
+        with self.lock:
+            for table in tables:
+                self.versions[table] = self.versions.get(table, 0) + 1
+
+class FileVersions():
+    #version por tabla en ficheros compartidos por los workers: un cambio en un worker invalida a todos
+    def __init__(self, path):
+        self.ttl = None
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def get(self, tables):
+        return tuple(map(self.read, tables))
+
+    def read(self, table):
+        try:
+            with open(os.path.join(self.path, table)) as version_file:
+                return version_file.read()
+        except OSError:
+            return ''
+
+    def bump(self, tables):
+        for table in tables:
+            temporary = os.path.join(self.path, '.%s.%d' % (table, os.getpid()))
+            with open(temporary, 'w') as version_file:
+                version_file.write('%d.%d' % (time.time_ns(), os.getpid()))
+            os.replace(temporary, os.path.join(self.path, table))
+
+def createVersions():
+    #por defecto en ficheros: gunicorn y uvicorn --workers no siempre se detectan desde el worker, y una
+    #MemoryVersions por proceso serviria datos viejos. 'memory' solo para un unico proceso
+    if os.environ.get('RESPONSE_CACHE_VERSIONS', 'file') != 'memory':
+        default_path = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        return FileVersions(os.environ.get('RESPONSE_CACHE_PATH', os.path.join(default_path, 'response_cache_versions')))
+    return MemoryVersions()
+
+def expiresAt():
+    return time.time() + versions.ttl if versions.ttl else None
+
+def isFresh(entry, current):
+    return entry['versions'] == current and (entry['expires'] is None or entry['expires'] > time.time())
+
+versions = createVersions()
+entries = OrderedDict()
+lock = threading.Lock()
+
+def cacheKey():
+    return (request.endpoint, tuple(sorted((request.view_args or {}).items())), tuple(sorted(request.args.items(multi=True))))
+
+def serve(tables, view, args, kwargs):
+    key = cacheKey()
+    current = versions.get(tables)
+    with lock:
+        entry = entries.get(key)
+        if entry is not None and isFresh(entry, current):
+            entries.move_to_end(key)
+        else:
+            entry = None
+    if entry is None:
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.is_streamed:
+            return response
+        body = response.get_data()
+        headers = list(filter(lambda x: x[0].lower() not in REBUILT_HEADERS, response.headers.items()))
+        entry = {'versions': current, 'expires': expiresAt(), 'body': body, 'mimetype': response.mimetype, 'headers': headers,
+            'etag': hashlib.sha1(body).hexdigest()}
+        with lock:
+            entries[key] = entry
+            while len(entries) > RESPONSE_CACHE_SIZE:
+                entries.popitem(last=False)
+    if request.if_none_match.contains(entry['etag']):
+        response = make_response('', 304)
+    else:
+        response = make_response(entry['body'], 200)
+        response.mimetype = entry['mimetype']
+    for name, value in entry['headers']:
+        response.headers[name] = value
+    response.set_etag(entry['etag'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+#tablas tocadas en cada flush (Mix.addCommit/store/delete, admin) + las que marca models.markChanged para SQL directo
+@event.listens_for(db.session, 'after_flush')
+def collect_changed_tables(session, flush_context):
+    changed = session.info.setdefault('changed_tables', set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(instance, '__tablename__', None)
+        if table:
+            changed.add(table)
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_changed_tables(session):
+    changed = session.info.pop('changed_tables', None)
+    if changed:
+        versions.bump(changed)
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_changed_tables(session):
+    session.info.pop('changed_tables', None)
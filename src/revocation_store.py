@@ -0,0 +1,159 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from models import db, RevokedToken
+
+#cuanto puede tardar un worker en ver un logout hecho en otro: un "no revocado" se cachea como mucho estos segundos
+NEGATIVE_TTL = int(os.environ.get('JWT_REVOCATION_NEGATIVE_TTL', 5))
+
+class RevocationStore():
+    #LRU en proceso delante del backend compartido. Los tokens revocados se cachean hasta que caducan:
+    #una revocacion no se deshace. Los "no revocados" solo NEGATIVE_TTL segundos, porque otro worker
+    #puede revocarlos; asi una peticion valida no consulta el backend en cada llamada
+    def __init__(self, cache_size=1024, negative_ttl=NEGATIVE_TTL):
+        self.cache = OrderedDict()
+        self.negative = OrderedDict()
+        self.cache_size = cache_size
+        self.negative_ttl = negative_ttl
+        self.lock = threading.Lock()
+
+    def revoke(self, jti, expires):
+        self.remember(jti, expires)
+        self.store(jti, expires)
+
+    def isRevoked(self, jti):
+        if self.cached(jti):
+            return True
+        if self.checkedRecently(jti):
+            return False
+        expires = self.lookup(jti)
+        if expires is None or expires < time.time():
+            self.rememberValid(jti)
+            return False
+        self.remember(jti, expires)
+        return True
+
+    def remember(self, jti, expires):
+        with self.lock:
+            self.negative.pop(jti, None)
+            self.cache[jti] = expires
+            self.cache.move_to_end(jti)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def rememberValid(self, jti):
+        if self.negative_ttl <= 0:
+            return
+        with self.lock:
+            self.negative[jti] = time.time() + self.negative_ttl
+            self.negative.move_to_end(jti)
+            while len(self.negative) > self.cache_size:
+                self.negative.popitem(last=False)
+
+    def checkedRecently(self, jti):
+        with self.lock:
+            expires = self.negative.get(jti)
+            if expires is None:
+                return False
+            if expires < time.time():
+                del self.negative[jti]
+                return False
+            return True
+
+    def cached(self, jti):
+        with self.lock:
+            expires = self.cache.get(jti)
+            if expires is None:
+                return False
+            if expires < time.time():
+                del self.cache[jti]
+                return False
+            self.cache.move_to_end(jti)
+            return True
+
+    def store(self, jti, expires):
+        raise NotImplementedError()
+
+    def lookup(self, jti):
+        raise NotImplementedError()
+
+class DatabaseRevocationStore(RevocationStore):
+    def store(self, jti, expires):
+        RevokedToken.query.filter(RevokedToken.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+        db.session.add(RevokedToken(jti=jti, expires_at=datetime.utcfromtimestamp(expires)))
+        db.session.commit()
+
+    def lookup(self, jti):
+        expires_at = db.session.query(RevokedToken.expires_at).filter_by(jti=jti).scalar()
+        if expires_at is None:
+            return None
+        return (expires_at - datetime(1970, 1, 1)).total_seconds()
+
+class FileRevocationStore(RevocationStore):
+    #un fichero por jti en un directorio compartido por los workers (p.ej. /dev/shm)
+    def __init__(self, path, cache_size=1024, sweep_every=100):
+        RevocationStore.__init__(self, cache_size)
+        self.path = path
+        self.sweep_every = sweep_every
+        self.revocations = 0
+        os.makedirs(path, exist_ok=True)
+
+    def filename(self, jti):
+        return os.path.join(self.path, hashlib.sha1(jti.encode('utf-8')).hexdigest())
+
+    def store(self, jti, expires):
+        #se escribe en un temporal y se renombra: un lector nunca ve el fichero a medio escribir
+        descriptor, temporary = tempfile.mkstemp(prefix='.', dir=self.path)
+        with os.fdopen(descriptor, 'w') as token_file:
+            token_file.write(str(int(expires)))
+        os.replace(temporary, self.filename(jti))
+        self.revocations += 1
+        if self.revocations % self.sweep_every == 0:
+            self.sweep()
+
+    def lookup(self, jti):
+        try:
+            with open(self.filename(jti)) as token_file:
+                content = token_file.read()
+        except OSError:
+            return None
+        try:
+            expires = int(content)
+        except ValueError:
+            return float('inf') #el fichero existe, luego el token fue revocado: ilegible no lo rehabilita
+        if expires < time.time():
+            self.remove(self.filename(jti))
+            return None
+        return expires
+
+    def sweep(self):
+        now = time.time()
+        for name in os.listdir(self.path):
+            if name.startswith('.'):
+                continue #temporales de store en curso
+            filename = os.path.join(self.path, name)
+            try:
+                with open(filename) as token_file:
+                    expires = int(token_file.read())
+            except (OSError, ValueError):
+                continue #solo se borra lo que se ha podido leer como caducado
+            if expires < now:
+                self.remove(filename)
+
+    def remove(self, filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+def createRevocationStore(backend=None, path=None):
+    backend = backend or os.environ.get('JWT_REVOCATION_STORE', 'database')
+    if backend == 'file':
+        default_path = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        path = path or os.environ.get('JWT_REVOCATION_PATH', os.path.join(default_path, 'revoked_tokens'))
+        return FileRevocationStore(path)
+    return DatabaseRevocationStore()
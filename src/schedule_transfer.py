@@ -0,0 +1,147 @@
+import io
+import csv
+import json
+import click
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy.exc import IntegrityError
+from models import db, Enterprise, Schedule, Space
+from booking import chunked
+from date_convert import ConvertDate
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+IMPORT_FIELDS = ('date', 'space_id', 'enterprise_id')
+EXPORT_FIELDS = ('id', 'date', 'space_id', 'enterprise_id', 'enterprise_name', 'space_name')
+MAX_REPORTED_ERRORS = 1000
+EXPORT_BATCH = 1000
+
+def formatFromName(name, default='csv'):
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    return 'ndjson' if extension in ('ndjson', 'jsonl') else 'csv' if extension == 'csv' else default
+
+def readRows(stream, format):
+    #genera (linea, fila) sin cargar el fichero entero; una linea ilegible se devuelve como error
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line, text in enumerate(stream, 1):
+            if not text.strip():
+                continue
+            try:
+                yield line, json.loads(text)
+            except ValueError:
+                yield line, None
+
+def parseRow(row, space_ids, enterprise_ids):
+    if not isinstance(row, dict):
+        raise ValueError("not a valid %s record" % '/'.join(IMPORT_FIELDS))
+    if not isinstance(row.get('date'), str):
+        raise ValueError("date must be YYYY-MM-DD HH:MM:SS and space_id/enterprise_id integers")
+    try:
+        slot = Schedule.slot(row['date'], row['space_id'], row['enterprise_id'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("date must be YYYY-MM-DD HH:MM:SS and space_id/enterprise_id integers")
+    if slot['space_id'] not in space_ids:
+        raise ValueError("space %d does not exist" % slot['space_id'])
+    if slot['enterprise_id'] not in enterprise_ids:
+        raise ValueError("enterprise %d does not exist" % slot['enterprise_id'])
+    return slot
+
+def importSchedules(rows):
+    #importacion administrativa (p. ej. migrar un edificio): no descuenta horas y admite fechas pasadas.
+    #cada lote es una transaccion con un INSERT multi-fila; las filas rechazadas se informan por linea
+    space_ids = set(map(lambda x: x.id, db.session.query(Space.id)))
+    enterprise_ids = set(map(lambda x: x.id, db.session.query(Enterprise.id)))
+    report = {'imported': 0, 'rejected': 0, 'errors': []}
+
+    def reject(line, error):
+        report['rejected'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line, 'error': error})
+
+    for chunk in chunked(rows):
+        #repetidos dentro del lote; entre lotes los detecta la consulta de conflictos contra lo ya insertado
+        seen = set()
+        slots = []
+        for line, row in chunk:
+            try:
+                slot = parseRow(row, space_ids, enterprise_ids)
+            except ValueError as error:
+                reject(line, str(error))
+                continue
+            key = (slot['space_id'], slot['date'])
+            if key in seen:
+                reject(line, "duplicated in the import")
+                continue
+            seen.add(key)
+            slots.append((line, slot))
+        conflicts = set(map(lambda x: (x['space_id'], x['date']), Schedule.getConflictingSlots(list(map(lambda x: x[1], slots)))))
+        valid = []
+        for line, slot in slots:
+            if (slot['space_id'], ConvertDate.dateToString(slot['date'])) in conflicts:
+                reject(line, "space %d is already booked at %s" % (slot['space_id'], ConvertDate.dateToString(slot['date'])))
+            else:
+                valid.append((line, slot))
+        try:
+            Schedule.insertSlots(list(map(lambda x: x[1], valid)))
+            db.session.commit()
+            report['imported'] += len(valid)
+        except IntegrityError:
+            db.session.rollback()
+            for line, slot in valid:
+                reject(line, "booked concurrently by another request")
+    report['errors'].sort(key=lambda x: x['line'])
+    return report
+
+def dateCriteria(start=None, end=None):
+    #dias YYYY-MM-DD inclusivos -> rango semiabierto sobre ix_schedule_date
+    criterion = []
+    if start:
+        criterion.append(Schedule.date >= ConvertDate.dayRange(ConvertDate.stringToDay(start))[0])
+    if end:
+        criterion.append(Schedule.date < ConvertDate.dayRange(ConvertDate.stringToDay(end))[1])
+    return criterion
+
+def exportSchedules(format, *criterion):
+    #yield_per (stream_results): cursor del lado del servidor; el texto sale por lotes de EXPORT_BATCH filas
+    rows = Schedule.iterProjected(*criterion, batch_size=EXPORT_BATCH)
+    if format == 'csv':
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, EXPORT_FIELDS).writeheader()
+        yield buffer.getvalue()
+    for chunk in chunked(rows, EXPORT_BATCH):
+        for row in chunk:
+            row['date'] = ConvertDate.dateToString(row['date'])
+        if format == 'csv':
+            buffer = io.StringIO()
+            csv.DictWriter(buffer, EXPORT_FIELDS).writerows(chunk)
+            yield buffer.getvalue()
+        else:
+            yield ''.join(map(lambda x: json.dumps(x, separators=(',', ':')) + '\n', chunk))
+
+schedules_cli = AppGroup('schedules', help='Import and export schedules as CSV or NDJSON.')
+
+@schedules_cli.command('import')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'format', type=click.Choice(list(FORMATS)), help='Defaults to the file extension.')
+@with_appcontext
+def import_command(source, format):
+    report = importSchedules(readRows(source, format or formatFromName(source.name)))
+    for error in report['errors']:
+        click.echo('line %d: %s' % (error['line'], error['error']), err=True)
+    click.echo('%d imported, %d rejected' % (report['imported'], report['rejected']))
+
+@schedules_cli.command('export')
+@click.argument('target', type=click.File('w', encoding='utf-8'))
+@click.option('--format', 'format', type=click.Choice(list(FORMATS)), help='Defaults to the file extension.')
+@click.option('--start', help='First day, YYYY-MM-DD.')
+@click.option('--end', help='Last day, YYYY-MM-DD.')
+@with_appcontext
+def export_command(target, format, start, end):
+    try:
+        criterion = dateCriteria(start, end)
+    except ValueError:
+        raise click.BadParameter('start and end must be YYYY-MM-DD')
+    for text in exportSchedules(format or formatFromName(target.name), *criterion):
+        target.write(text)
@@ -1,4 +1,4 @@
-from flask import jsonify, url_for
+from flask import jsonify, url_for, json, Response, stream_with_context
 
 class APIException(Exception):
     status_code = 400
@@ -15,6 +15,27 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def json_body(data):
+    #mismo texto que jsonify(), para respuestas que se guardan ya serializadas
+    return json.dumps(data, separators=(',', ':')) + '\n'
+
+def stream_json_array(items, chunk_size=100):
+    #escribe el array JSON por trozos a medida que se generan los elementos
+    def generate():
+        yield '['
+        chunk = []
+        separator = ''
+        for item in items:
+            chunk.append(json.dumps(item, separators=(',', ':')))
+            if len(chunk) == chunk_size:
+                yield separator + ','.join(chunk)
+                separator = ','
+                chunk = []
+        if chunk:
+            yield separator + ','.join(chunk)
+        yield ']\n'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+import pytest
+
+#entorno antes de importar main: SQLite en fichero, sin admin, sin cache de respuestas y hash barato
+DATABASE = os.path.join(tempfile.mkdtemp(prefix='reserva-tests-'), 'test.db')
+os.environ['DB_CONNECTION_STRING'] = 'sqlite:///' + DATABASE
+os.environ['ENABLE_ADMIN'] = 'false'
+os.environ['CREATE_DATABASE_ON_START'] = 'false'
+os.environ['RESPONSE_CACHE_SIZE'] = '0'
+os.environ['PASSWORD_HASH_ITERATIONS'] = '1000'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from sqlalchemy import event
+from main import app as flask_app
+from models import db
+from principal_cache import principals
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        principals.clear() #drop_all no dispara los eventos que invalidan la cache: los ids se reutilizan entre tests
+        yield flask_app
+        db.session.remove()
+
+@pytest.fixture
+def statements(app):
+    #cuenta las sentencias SQL enviadas al motor mientras dura el test
+    counter = [0]
+    def count_statement(*args):
+        counter[0] += 1
+    event.listen(db.engine, 'before_cursor_execute', count_statement)
+    yield counter
+    event.remove(db.engine, 'before_cursor_execute', count_statement)
@@ -0,0 +1,55 @@
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy.exc import OperationalError
+from models import db, Enterprise, Spacetype, Space, Schedule
+from booking import reserveSlots
+from exceptions.not_enough_hours_error import NotEnoughHoursError
+from exceptions.duplicate_entity_error import DuplicateEntityError
+
+THREADS = 16
+ATTEMPTS = 4
+HOURS = 20
+
+def test_parallel_bookings_never_overspend_hours(app):
+    enterprise = Enterprise(name='Enterprise', last_name='Test', email='e@test.local', password='secret',
+        cif='B1', phone='600000000', tot_hours=HOURS, current_hours=HOURS)
+    spacetype = Spacetype(description='Type')
+    db.session.add_all([enterprise, spacetype])
+    db.session.flush()
+    space = Space(name='Space', description='Test', spacetype_id=spacetype.id)
+    db.session.add(space)
+    db.session.commit()
+    enterprise_id, space_id = enterprise.id, space.id
+    start = datetime(2030, 1, 7, 9)
+    outcomes = []
+    barrier = threading.Barrier(THREADS)
+
+    def book(worker):
+        #cada intento reserva 2 horas distintas; los hilos compiten por las mismas horas de la empresa
+        with app.app_context():
+            barrier.wait()
+            for attempt in range(ATTEMPTS):
+                date = start + timedelta(days=worker * ATTEMPTS + attempt)
+                slots = [Schedule.slot(date, space_id, enterprise_id), Schedule.slot(date + timedelta(hours=1), space_id, enterprise_id)]
+                try:
+                    reserveSlots(enterprise_id, slots)
+                    outcomes.append('booked')
+                except NotEnoughHoursError:
+                    outcomes.append('not enough hours')
+                except (DuplicateEntityError, OperationalError):
+                    outcomes.append('failed')
+            db.session.remove()
+
+    threads = list(map(lambda x: threading.Thread(target=book, args=(x,)), range(THREADS)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db.session.expire_all()
+    current_hours = db.session.query(Enterprise.current_hours).filter(Enterprise.id == enterprise_id).scalar()
+    booked_rows = db.session.query(Schedule).filter(Schedule.enterprise_id == enterprise_id).count()
+    assert len(outcomes) == THREADS * ATTEMPTS
+    assert current_hours >= 0
+    assert booked_rows == HOURS - current_hours
+    assert booked_rows == 2 * outcomes.count('booked')
@@ -0,0 +1,44 @@
+from sqlalchemy import create_engine
+from flask_jwt_extended import create_access_token
+from sqlalchemy.pool import QueuePool
+from engine_config import poolHealth
+from models import db, Enterprise
+
+def test_saturated_pool_is_reported_without_failing(app, monkeypatch):
+    monkeypatch.setenv('DB_MAX_OVERFLOW', '1')
+    engine = create_engine('sqlite://', poolclass=QueuePool, pool_size=1, max_overflow=1)
+    first = engine.connect()
+    health = poolHealth(engine)
+    assert health['capacity'] == 2 and health['checked_out'] == 1 and not health['saturated']
+    second = engine.connect()
+    health = poolHealth(engine)
+    assert health['saturated'] and health['healthy']
+    second.close()
+    first.close()
+    assert not poolHealth(engine)['saturated']
+
+def test_health_check_stays_up_unless_the_deep_check_fails(app):
+    client = app.test_client()
+    response = client.get('/health')
+    assert response.status_code == 200
+    assert response.get_json()['saturated'] is False
+    response = client.get('/health?deep=1')
+    assert response.status_code == 200
+    assert response.get_json()['database'] == 'ok'
+
+def test_metrics_require_an_admin_token(app):
+    enterprises = list(map(lambda x: Enterprise(name='Enterprise %d' % x, last_name='Test', email='e%d@test.local' % x,
+        password='secret', cif='B%d' % x, phone='6%d' % x, tot_hours=10, current_hours=10, is_admin=x == 0), range(2)))
+    db.session.add_all(enterprises)
+    db.session.commit()
+    ids = list(map(lambda x: x.id, enterprises))
+    client = app.test_client()
+    def get(url, id=None):
+        #contexto nuevo por peticion: el principal se guarda en g y el del fixture se compartiria
+        with app.app_context():
+            headers = {'Authorization': 'Bearer ' + create_access_token(identity=id)} if id else {}
+            return client.get(url, headers=headers).status_code
+    for url in ('/metrics', '/metrics/pool'):
+        assert get(url) == 401
+        assert get(url, ids[1]) == 400
+        assert get(url, ids[0]) == 200
@@ -0,0 +1,36 @@
+import pytest
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from models import db, Enterprise, Brand, Spacetype, Space, Equipment, Schedule
+
+def seed(rows):
+    enterprises = list(map(lambda x: Enterprise(name='Enterprise %d' % x, last_name='Test', email='e%d@test.local' % x,
+        password='secret', cif='B%d' % x, phone='6%d' % x, tot_hours=100, current_hours=100), range(rows)))
+    spacetypes = list(map(lambda x: Spacetype(description='Type %d' % x), range(rows)))
+    db.session.add_all(enterprises + spacetypes)
+    db.session.flush()
+    spaces = list(map(lambda x: Space(name='Space %d' % x, description='Test', spacetype_id=spacetypes[x].id), range(rows)))
+    db.session.add_all(spaces)
+    db.session.flush()
+    start = datetime(2030, 1, 7, 9)
+    for x in range(rows):
+        db.session.add(Brand(name='Brand %d' % x, description='Test', logo='logo.png', enterprise_id=enterprises[x].id))
+        db.session.add(Equipment(quantity=1, name='Equipment %d' % x, description='Test', space_id=spaces[x].id))
+        for hour in range(3):
+            db.session.add(Schedule(date=start + timedelta(days=x, hours=hour), space_id=spaces[x].id, enterprise_id=enterprises[(x + hour) % rows].id))
+    db.session.commit()
+    return enterprises[0].id
+
+#el numero de sentencias no depende del numero de filas: la carga sale del loaderPlan de cada modelo.
+#/enterprises exige token: la primera peticion consulta los tokens revocados y las siguientes usan la cache negativa
+@pytest.mark.parametrize('rows', [3, 30])
+@pytest.mark.parametrize('url, expected', [('/spacetypes', 4), ('/spaces', 3), ('/enterprises', 3)])
+def test_list_endpoints_use_a_fixed_number_of_queries(app, statements, rows, url, expected):
+    enterprise_id = seed(rows)
+    headers = {'Authorization': 'Bearer ' + create_access_token(identity=enterprise_id)}
+    app.test_client().get(url, headers=headers)
+    statements[0] = 0
+    response = app.test_client().get(url, headers=headers)
+    assert response.status_code == 200
+    assert len(response.get_json()) == rows
+    assert statements[0] == expected
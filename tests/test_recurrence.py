@@ -0,0 +1,48 @@
+import json
+import random
+from datetime import date, timedelta
+from models import db, Enterprise, Spacetype, Space, Schedule
+
+def test_count_matches_the_expansion():
+    generator = random.Random(7)
+    for _ in range(200):
+        start = date(2030, 1, 1) + timedelta(days=generator.randrange(14))
+        end = start + timedelta(days=generator.randrange(30))
+        weekdays = set(generator.sample(range(7), generator.randrange(1, 8)))
+        space_ids = list(range(generator.randrange(1, 4)))
+        from_hour = generator.randrange(23)
+        to_hour = generator.randrange(from_hour + 1, 25)
+        expanded = sum(1 for _ in Schedule.expandRecurrence(1, space_ids, weekdays, start, end, from_hour, to_hour))
+        assert Schedule.countRecurrence(space_ids, weekdays, start, end, from_hour, to_hour) == expanded
+
+def rule(enterprise_id, space_ids, **changes):
+    body = {'enterprise_id': enterprise_id, 'space_ids': space_ids, 'weekdays': [0, 1, 2, 3, 4],
+        'start': '2030-01-07', 'end': '2030-03-29', 'from_hour': 9, 'to_hour': 11}
+    body.update(changes)
+    return body
+
+def test_impossible_rules_are_rejected_before_expanding(app, statements):
+    enterprise = Enterprise(name='Enterprise', last_name='Test', email='e@test.local', password='secret',
+        cif='B1', phone='600000000', tot_hours=100, current_hours=100)
+    spacetype = Spacetype(description='Type')
+    db.session.add_all([enterprise, spacetype])
+    db.session.flush()
+    space = Space(name='Space', description='Test', spacetype_id=spacetype.id)
+    db.session.add(space)
+    db.session.commit()
+    enterprise_id, space_id = enterprise.id, space.id
+    client = app.test_client()
+    #fuera de rango, espacios inexistentes y horas insuficientes: ninguna consulta por lote de la regla
+    statements[0] = 0
+    response = client.post('/schedules/recurring', json=rule(enterprise_id, list(range(1000, 1300)), weekdays=list(range(7)),
+        start='2030-01-01', end='2030-12-31', from_hour=0, to_hour=24))
+    assert response.status_code == 400
+    response = client.post('/schedules/recurring', json=rule(enterprise_id, list(range(1000, 1003))))
+    assert response.status_code == 422
+    response = client.post('/schedules/recurring', json=rule(enterprise_id, [space_id]))
+    assert response.status_code == 424
+    assert statements[0] == 3
+    response = client.post('/schedules/recurring', json=rule(enterprise_id, [space_id], end='2030-02-22'))
+    assert response.status_code == 201
+    assert json.loads(response.data)['slots'] == 70
+    assert db.session.query(Enterprise.current_hours).filter_by(id=enterprise_id).scalar() == 30
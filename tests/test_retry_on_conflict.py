@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy.exc import DBAPIError, DatabaseError, IntegrityError, InternalError, OperationalError
+from decorators.retry_on_conflict_decorator import retry_on_conflict
+
+class DriverError(Exception):
+    #imita los errores de los drivers: mysql-connector expone errno/sqlstate, psycopg2 pgcode
+    def __init__(self, message, errno=None, sqlstate=None, pgcode=None):
+        Exception.__init__(self, message)
+        self.errno = errno
+        self.sqlstate = sqlstate
+        self.pgcode = pgcode
+
+def wrapped(cls, orig, connection_invalidated=False):
+    return cls('SELECT 1', {}, orig, connection_invalidated=connection_invalidated)
+
+def flaky(error, failures):
+    calls = [0]
+    @retry_on_conflict(retries=3, backoff=0)
+    def operation():
+        calls[0] += 1
+        if calls[0] <= failures:
+            raise error
+        return 'ok'
+    return operation, calls
+
+@pytest.mark.parametrize('error', [
+    wrapped(InternalError, DriverError('Deadlock found when trying to get lock', errno=1213, sqlstate='40001')),
+    wrapped(DatabaseError, DriverError('Lock wait timeout exceeded', errno=1205, sqlstate='HY000')),
+    wrapped(OperationalError, DriverError('could not serialize access', pgcode='40001')),
+    wrapped(OperationalError, DriverError('deadlock detected', pgcode='40P01')),
+    wrapped(OperationalError, DriverError('Lost connection to MySQL server', errno=2013), connection_invalidated=True),
+    wrapped(OperationalError, DriverError('database is locked')),
+])
+def test_transient_errors_are_retried(app, error):
+    operation, calls = flaky(error, 2)
+    assert operation() == 'ok'
+    assert calls[0] == 3
+
+def test_transient_errors_give_up_after_the_last_attempt(app):
+    error = wrapped(InternalError, DriverError('Deadlock found when trying to get lock', errno=1213, sqlstate='40001'))
+    operation, calls = flaky(error, 3)
+    with pytest.raises(InternalError):
+        operation()
+    assert calls[0] == 3
+
+@pytest.mark.parametrize('error', [
+    wrapped(IntegrityError, DriverError('Duplicate entry', errno=1062, sqlstate='23000')),
+    wrapped(DatabaseError, DriverError('Unknown database', errno=1049, sqlstate='42000')),
+    wrapped(OperationalError, DriverError('no such table: schedule')),
+])
+def test_other_database_errors_are_not_retried(app, error):
+    operation, calls = flaky(error, 1)
+    with pytest.raises(DBAPIError):
+        operation()
+    assert calls[0] == 1
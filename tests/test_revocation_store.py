@@ -0,0 +1,40 @@
+import os
+import time
+from revocation_store import FileRevocationStore
+
+def test_file_store_keeps_tokens_revoked_while_the_file_is_unreadable(tmp_path):
+    store = FileRevocationStore(str(tmp_path))
+    store.revoke('jti-1', time.time() + 60)
+    assert FileRevocationStore(str(tmp_path)).isRevoked('jti-1')
+    filename = store.filename('jti-1')
+    open(filename, 'w').close() #un escritor a medias no debe deshacer la revocacion
+    assert FileRevocationStore(str(tmp_path)).isRevoked('jti-1')
+    store.sweep()
+    assert os.path.exists(filename)
+
+def test_file_store_sweeps_expired_tokens(tmp_path):
+    store = FileRevocationStore(str(tmp_path))
+    store.revoke('expired', time.time() - 1)
+    store.revoke('valid', time.time() + 60)
+    store.sweep()
+    assert not os.path.exists(store.filename('expired'))
+    assert os.listdir(str(tmp_path)) == [os.path.basename(store.filename('valid'))]
+
+def test_valid_tokens_are_looked_up_once_per_negative_ttl(tmp_path):
+    store = FileRevocationStore(str(tmp_path))
+    lookups = []
+    lookup = store.lookup
+    store.lookup = lambda jti: lookups.append(jti) or lookup(jti)
+    assert not store.isRevoked('jti-1')
+    assert not store.isRevoked('jti-1')
+    assert lookups == ['jti-1']
+    #revocado por otro worker: se ve cuando caduca la entrada negativa
+    FileRevocationStore(str(tmp_path)).revoke('jti-1', time.time() + 60)
+    store.negative['jti-1'] = time.time() - 1
+    assert store.isRevoked('jti-1')
+
+def test_revoking_clears_the_negative_entry(tmp_path):
+    store = FileRevocationStore(str(tmp_path))
+    assert not store.isRevoked('jti-1')
+    store.revoke('jti-1', time.time() + 60)
+    assert store.isRevoked('jti-1')